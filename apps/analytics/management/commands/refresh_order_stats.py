@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from apps.analytics.services import OrderStatsService
+
+
+class Command(BaseCommand):
+    help = 'Bring the order rollups up to date.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Rebuild every day instead of the changed ones')
+
+    def handle(self, *args, **options):
+        days = OrderStatsService.refresh(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {days} day(s)'))
@@ -0,0 +1,40 @@
+from django.db import models
+
+from apps.product.models import Product
+
+
+class DailyOrderStats(models.Model):
+    """Orders and revenue per creation day and status."""
+    day = models.DateField()
+    status = models.CharField(max_length=10)
+    orders = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'status'], name='dailyorderstats_day_status_uniq'),
+        ]
+
+
+class DailyProductStats(models.Model):
+    """Units sold and revenue per product and order creation day, cancelled orders excluded."""
+    day = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    quantity = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'product'], name='dailyproductstats_day_prod_uniq'),
+        ]
+
+
+class StatsWatermark(models.Model):
+    """How far a rollup job has read the order table."""
+    name = models.CharField(max_length=50, unique=True)
+    value = models.DateTimeField()
+
+
+class StatsDirtyDay(models.Model):
+    """Days to rebuild that the watermark cannot see, e.g. of deleted orders."""
+    day = models.DateField(unique=True)
@@ -0,0 +1,119 @@
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from apps.order.models import Order, OrderItem
+from .models import DailyOrderStats, DailyProductStats, StatsDirtyDay, StatsWatermark
+
+
+class OrderStatsService:
+    """
+    Keeps the daily rollups in step with the order table.
+
+    ``refresh`` looks at orders whose ``updated_at`` moved past the stored
+    watermark (plus the days marked dirty by deletions) and rebuilds only
+    the days those orders were created on, so the cost follows the amount
+    of change rather than the size of the order history. The watermark
+    trails the clock by ``ORDER_STATS_WATERMARK_LAG`` so transactions still
+    in flight at the previous run are picked up; rebuilding a day twice is
+    harmless.
+    """
+    watermark_name = 'order_stats'
+    days_per_batch = 31
+
+    @classmethod
+    def mark_dirty(cls, moment):
+        StatsDirtyDay.objects.get_or_create(day=timezone.localdate(moment))
+
+    @classmethod
+    def refresh(cls, full=False):
+        """Bring the rollups up to date and return the number of rebuilt days."""
+        started = timezone.now()
+        watermark = StatsWatermark.objects.filter(name=cls.watermark_name).first()
+
+        changed = Order.objects.with_deleted()
+        if watermark is not None and not full:
+            changed = changed.filter(updated_at__gt=watermark.value)
+        days = set(
+            changed.annotate(day=TruncDate('created_at')).order_by().values_list('day', flat=True).distinct()
+        )
+        dirty = list(StatsDirtyDay.objects.values_list('pk', 'day'))
+        days.update(day for _, day in dirty)
+
+        ordered_days = sorted(days)
+        for i in range(0, len(ordered_days), cls.days_per_batch):
+            cls.rebuild_days(ordered_days[i:i + cls.days_per_batch])
+
+        StatsDirtyDay.objects.filter(pk__in=[pk for pk, _ in dirty]).delete()
+        StatsWatermark.objects.update_or_create(
+            name=cls.watermark_name,
+            defaults={'value': started - timedelta(seconds=settings.ORDER_STATS_WATERMARK_LAG)}
+        )
+        return len(days)
+
+    @staticmethod
+    def _day_range(days):
+        condition = Q()
+        for day in days:
+            start = timezone.make_aware(datetime.combine(day, time.min))
+            condition |= Q(created_at__gte=start, created_at__lt=start + timedelta(days=1))
+        return condition
+
+    @classmethod
+    def rebuild_days(cls, days):
+        """Recompute both rollups for ``days`` from the live orders."""
+        if not days:
+            return
+        orders = Order.objects.filter(cls._day_range(days)).annotate(day=TruncDate('created_at'))
+        order_rows = orders.order_by().values('day', 'status').annotate(
+            orders=Count('id'), revenue=Sum('total_price')
+        )
+
+        line_total = ExpressionWrapper(F('price') * F('quantity'), output_field=DecimalField())
+        item_rows = OrderItem.objects.filter(
+            order__in=orders.exclude(status='CANCELLED').values('pk')
+        ).annotate(day=TruncDate('order__created_at')).order_by().values('day', 'product_id').annotate(
+            units=Sum('quantity'), revenue=Sum(line_total)
+        )
+
+        with transaction.atomic():
+            DailyOrderStats.objects.filter(day__in=days).delete()
+            DailyProductStats.objects.filter(day__in=days).delete()
+            DailyOrderStats.objects.bulk_create([
+                DailyOrderStats(day=row['day'], status=row['status'], orders=row['orders'], revenue=row['revenue'])
+                for row in order_rows
+            ])
+            DailyProductStats.objects.bulk_create([
+                DailyProductStats(
+                    day=row['day'], product_id=row['product_id'], quantity=row['units'], revenue=row['revenue']
+                )
+                for row in item_rows
+            ])
+
+    @classmethod
+    def summary(cls, date_from=None, date_to=None, top_products=10):
+        """Read the rollups for a date range, never touching the order table."""
+        order_stats = DailyOrderStats.objects.all()
+        product_stats = DailyProductStats.objects.all()
+        if date_from:
+            order_stats = order_stats.filter(day__gte=date_from)
+            product_stats = product_stats.filter(day__gte=date_from)
+        if date_to:
+            order_stats = order_stats.filter(day__lte=date_to)
+            product_stats = product_stats.filter(day__lte=date_to)
+
+        return {
+            'by_day': list(order_stats.order_by('day', 'status').values('day', 'status', 'orders', 'revenue')),
+            'by_status': list(
+                order_stats.order_by('status').values('status').annotate(orders=Sum('orders'), revenue=Sum('revenue'))
+            ),
+            'top_products': list(
+                product_stats.order_by().values('product_id').annotate(
+                    quantity=Sum('quantity'), revenue=Sum('revenue')
+                ).order_by('-revenue', 'product_id')[:top_products]
+            ),
+        }
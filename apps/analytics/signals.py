@@ -0,0 +1,12 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from apps.order.models import Order
+from .services import OrderStatsService
+
+
+@receiver(post_delete, sender=Order)
+def mark_deleted_order_day(sender, instance, **kwargs):
+    # A deleted order leaves no updated_at behind for the watermark to find.
+    # Item changes always move the order's updated_at, so they need no hook.
+    OrderStatsService.mark_dirty(instance.created_at)
@@ -0,0 +1,9 @@
+from celery import shared_task
+
+from .services import OrderStatsService
+
+
+@shared_task
+def refresh_order_stats():
+    """Scheduled by celery beat, see CELERY_BEAT_SCHEDULE."""
+    return OrderStatsService.refresh()
@@ -0,0 +1,86 @@
+from datetime import date, datetime, timezone as dt_timezone
+
+from django.test import TestCase, override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from apps.analytics.models import DailyOrderStats, DailyProductStats
+from apps.analytics.services import OrderStatsService
+from apps.order.models import Order, OrderItem
+from apps.product.models import Product
+from apps.users.models import User
+
+
+def _make_order(customer, product, day, quantity=1, status='PENDING'):
+    order = Order.objects.create(customer=customer, status=status)
+    order.add_items([OrderItem(product=product, quantity=quantity)])
+    Order.objects.filter(pk=order.pk).update(created_at=datetime(2024, 1, day, 12, tzinfo=dt_timezone.utc))
+    return order
+
+
+@override_settings(ORDER_STATS_WATERMARK_LAG=0)
+class OrderStatsServiceTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(username='stats1', email='stats1@admin.com', password='testpass')
+        self.product = Product.objects.create(name='p', price=10, quantity=100)
+        self.orders = [
+            _make_order(self.customer, self.product, 1, quantity=2),
+            _make_order(self.customer, self.product, 1, quantity=1, status='CANCELLED'),
+            _make_order(self.customer, self.product, 2, quantity=3),
+        ]
+
+    def _stats(self, day):
+        return {
+            row.status: (row.orders, row.revenue)
+            for row in DailyOrderStats.objects.filter(day=date(2024, 1, day))
+        }
+
+    def test_refresh_builds_the_rollups(self):
+        self.assertEqual(OrderStatsService.refresh(), 2)
+        self.assertEqual(self._stats(1), {'PENDING': (1, 20), 'CANCELLED': (1, 10)})
+        self.assertEqual(self._stats(2), {'PENDING': (1, 30)})
+        self.assertEqual(
+            DailyProductStats.objects.get(day=date(2024, 1, 1), product=self.product).quantity, 2
+        )
+
+    def test_only_changed_days_are_rebuilt(self):
+        OrderStatsService.refresh()
+        self.assertEqual(OrderStatsService.refresh(), 0)
+
+        order = self.orders[2]
+        order.refresh_from_db()
+        order.status = 'COMPLETED'
+        order.save()
+        self.assertEqual(OrderStatsService.refresh(), 1)
+        self.assertEqual(self._stats(2), {'COMPLETED': (1, 30)})
+
+        Order.objects.get(pk=self.orders[0].pk).delete()
+        self.assertEqual(OrderStatsService.refresh(), 1)
+        self.assertEqual(self._stats(1), {'CANCELLED': (1, 10)})
+        self.assertFalse(DailyProductStats.objects.filter(day=date(2024, 1, 1)).exists())
+
+
+class OrderStatsEndpointTests(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            username='stats2', email='stats2@admin.com', password='testpass', is_admin=True
+        )
+        self.customer = User.objects.create_user(username='stats3', email='stats3@admin.com', password='testpass')
+        product = Product.objects.create(name='p', price=10, quantity=100)
+        for day in range(1, 6):
+            _make_order(self.customer, product, day)
+        OrderStatsService.refresh()
+
+    def test_stats_are_read_from_the_rollups(self):
+        self.client.force_authenticate(user=self.admin)
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/orders/stats/', {'date_from': '2024-01-02', 'date_to': '2024-01-03'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['data']['by_day']), 2)
+        self.assertEqual(response.data['data']['by_status'][0]['revenue'], 20)
+        self.assertEqual(response.data['data']['top_products'][0]['quantity'], 2)
+
+    def test_stats_are_admin_only(self):
+        self.client.force_authenticate(user=self.customer)
+        response = self.client.get('/api/orders/stats/')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
@@ -0,0 +1,23 @@
+from django.db import connections
+
+
+def iterate(queryset, chunk_size=2000):
+    """
+    Yield the objects of ``queryset`` ``chunk_size`` rows at a time, with
+    prefetches done per chunk. Uses a server-side cursor where the database
+    allows one, otherwise (DISABLE_SERVER_SIDE_CURSORS, e.g. behind a
+    transaction pooler) keyset pages on the primary key. In that case the
+    queryset's own ordering is replaced by ``pk``.
+    """
+    if not connections[queryset.db].settings_dict.get('DISABLE_SERVER_SIDE_CURSORS'):
+        yield from queryset.iterator(chunk_size=chunk_size)
+        return
+
+    queryset = queryset.order_by('pk')
+    last = None
+    while True:
+        chunk = list((queryset if last is None else queryset.filter(pk__gt=last))[:chunk_size])
+        yield from chunk
+        if len(chunk) < chunk_size:
+            return
+        last = chunk[-1].pk
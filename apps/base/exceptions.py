@@ -23,7 +23,7 @@ class PermissionDeniedError(CustomException):
         super().__init__(message, status_code=403)
 
 class NotEnoughStock(CustomException):
-    """Raised when a resource is not found."""
+    """Raised when one or more products do not have enough stock."""
 
-    def __init__(self, message="We dont have enough stock for this product."):
-        super().__init__(message, status_code=400)
\ No newline at end of file
+    def __init__(self, message="We dont have enough stock for this product.", details: dict = None):
+        super().__init__(message, status_code=400, details=details)
\ No newline at end of file
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from apps.base.purge import SoftDeletePurgeService
+
+
+class Command(BaseCommand):
+    help = 'Archive and remove rows soft-deleted longer ago than the retention period.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('models', nargs='*', help='Model labels, e.g. product.Product (default: PURGE_MODELS)')
+        parser.add_argument('--days', type=int, help='Retention in days (default: SOFT_DELETE_RETENTION_DAYS)')
+        parser.add_argument('--batch-size', type=int, help='Rows per transaction (default: PURGE_BATCH_SIZE)')
+
+    def handle(self, *args, **options):
+        purged = SoftDeletePurgeService.purge(options['models'], options['days'], options['batch_size'])
+        for label, count in purged.items():
+            self.stdout.write(self.style.SUCCESS(f'{label}: purged {count} row(s)'))
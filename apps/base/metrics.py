@@ -0,0 +1,220 @@
+import contextvars
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+
+HISTOGRAMS = {
+    'http_request_duration_seconds': ('Time spent answering requests.', DURATION_BUCKETS),
+    'http_request_db_seconds': ('Time spent in database queries per request.', DURATION_BUCKETS),
+    'http_request_serialize_seconds': ('Time spent serializing per request.', DURATION_BUCKETS),
+    'http_request_queries': ('Database queries per request.', QUERY_BUCKETS),
+}
+COUNTERS = {
+    'http_requests_total': 'Requests answered, by status code.',
+    'product_cache_hits_total': 'Product cache lookups answered from the cache, by kind.',
+    'product_cache_misses_total': 'Product cache lookups that went to the database, by kind.',
+    'user_cache_hits_total': 'User cache lookups answered from a cache, by layer.',
+    'user_cache_misses_total': 'User cache lookups that went to the database.',
+}
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """What one request spent its time on, filled in while it runs."""
+    __slots__ = ('started', 'queries', 'db_time', 'timings', '_depth')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.timings = defaultdict(float)
+        self._depth = defaultdict(int)
+
+    def __call__(self, execute, sql, params, many, context):
+        # A connection.execute_wrapper, counting and timing every query
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+
+    @contextmanager
+    def timed(self, name):
+        # Only the outermost block counts, nested serializers are not added twice
+        self._depth[name] += 1
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._depth[name] -= 1
+            if not self._depth[name]:
+                self.timings[name] += time.perf_counter() - started
+
+
+@contextmanager
+def _untimed():
+    yield
+
+
+def start_request():
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+def timed(name):
+    """Add the time spent in the block to the current request's ``name`` timing."""
+    metrics = _current.get()
+    return _untimed() if metrics is None else metrics.timed(name)
+
+
+def count(metric, labels='', amount=1):
+    """Add ``amount`` to one of COUNTERS, from anywhere in the process."""
+    if amount:
+        get_store().record([], [(metric, labels, amount)])
+
+
+class MetricsStore:
+    """
+    Histograms and counters of this process, as ``{(metric, labels, slot): value}``
+    where slot is a bucket index, ``'sum'`` or ``''`` for counters.
+    """
+
+    def __init__(self):
+        self._values = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def record(self, observations, counters):
+        """``observations`` is ``[(metric, labels, value)]``, ``counters`` ``[(metric, labels, amount)]``."""
+        with self._lock:
+            values = self._values
+            for metric, labels, value in observations:
+                buckets = HISTOGRAMS[metric][1]
+                slot = next((i for i, bound in enumerate(buckets) if value <= bound), len(buckets))
+                values[(metric, labels, slot)] += 1
+                values[(metric, labels, 'sum')] += value
+            for metric, labels, amount in counters:
+                values[(metric, labels, '')] += amount
+
+    def drain(self):
+        with self._lock:
+            values, self._values = self._values, defaultdict(float)
+        return values
+
+    def merge(self, values):
+        with self._lock:
+            for key, value in values.items():
+                self._values[key] += value
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class RedisMetricsStore(MetricsStore):
+    """
+    Aggregates in the process like MetricsStore and adds what it collected
+    to a Redis hash at most every ``flush_interval`` seconds, so every
+    worker's requests end up in one set of series at the cost of one
+    pipelined round trip per interval rather than per request.
+    """
+    key = 'metrics'
+
+    def __init__(self, client, flush_interval):
+        super().__init__()
+        self._client = client
+        self._flush_interval = flush_interval
+        self._flushed = time.monotonic()
+
+    def record(self, observations, counters):
+        super().record(observations, counters)
+        if time.monotonic() - self._flushed >= self._flush_interval:
+            self.flush()
+
+    def flush(self):
+        self._flushed = time.monotonic()
+        values = self.drain()
+        if not values:
+            return
+        try:
+            pipe = self._client.pipeline(transaction=False)
+            for (metric, labels, slot), value in values.items():
+                pipe.hincrbyfloat(self.key, f'{metric}\t{labels}\t{slot}', value)
+            pipe.execute()
+        except Exception:
+            logger.warning('Could not flush metrics to Redis, keeping them for the next flush', exc_info=True)
+            self.merge(values)
+
+    def snapshot(self):
+        self.flush()
+        try:
+            stored = self._client.hgetall(self.key)
+        except Exception:
+            logger.warning('Could not read metrics from Redis', exc_info=True)
+            return super().snapshot()
+        values = {}
+        for field, value in stored.items():
+            metric, labels, slot = field.decode().split('\t')
+            values[(metric, labels, int(slot) if slot.isdigit() else slot)] = float(value)
+        return values
+
+
+_store = None
+
+
+def get_store():
+    """Redis backed when the cache is Redis, this process only otherwise."""
+    global _store
+    if _store is None:
+        try:
+            from django_redis import get_redis_connection
+            _store = RedisMetricsStore(get_redis_connection('default'), settings.METRICS_FLUSH_INTERVAL)
+        except (ImportError, NotImplementedError):
+            _store = MetricsStore()
+    return _store
+
+
+def render(values):
+    """Prometheus text exposition of a store snapshot."""
+    series = defaultdict(dict)
+    for (metric, labels, slot), value in values.items():
+        series[metric].setdefault(labels, {})[slot] = value
+
+    lines = []
+    for metric, (help_text, buckets) in HISTOGRAMS.items():
+        lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} histogram']
+        for labels, slots in sorted(series.get(metric, {}).items()):
+            count = 0
+            for i, bound in enumerate(buckets + ('+Inf',)):
+                count += slots.get(i, 0)
+                lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {_number(count)}')
+            lines.append(f'{metric}_sum{{{labels}}} {_number(slots.get("sum", 0))}')
+            lines.append(f'{metric}_count{{{labels}}} {_number(count)}')
+    for metric, help_text in COUNTERS.items():
+        lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} counter']
+        for labels, slots in sorted(series.get(metric, {}).items()):
+            name = f'{metric}{{{labels}}}' if labels else metric
+            lines.append(f'{name} {_number(slots.get("", 0))}')
+    return '\n'.join(lines) + '\n'
+
+
+def _number(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
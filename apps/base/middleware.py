@@ -0,0 +1,64 @@
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import metrics
+
+
+def view_name(view_func, method):
+    """``OrderViewSet.create`` for viewset actions, the class or function name otherwise."""
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return getattr(view_func, '__name__', 'unknown')
+    action = (getattr(view_func, 'actions', None) or {}).get(method.lower())
+    return f'{cls.__name__}.{action}' if action else cls.__name__
+
+
+class MetricsMiddleware:
+    """
+    Times every request per view: total latency, number of queries and
+    time spent in them, and time spent serializing (see metrics.timed).
+    The figures go out in a ``Server-Timing`` header and into the
+    histograms served on /metrics. Per request this costs a clock read per
+    query and a dict update under a lock.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+
+        request_metrics, token = metrics.start_request()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(request_metrics))
+                response = self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        total = time.perf_counter() - request_metrics.started
+        serialize = request_metrics.timings['serialize']
+
+        labels = f'view="{getattr(request, "metrics_view", "unmatched")}",method="{request.method}"'
+        metrics.get_store().record(
+            [
+                ('http_request_duration_seconds', labels, total),
+                ('http_request_db_seconds', labels, request_metrics.db_time),
+                ('http_request_serialize_seconds', labels, serialize),
+                ('http_request_queries', labels, request_metrics.queries),
+            ],
+            [('http_requests_total', f'{labels},status="{response.status_code}"', 1)],
+        )
+        response['Server-Timing'] = (
+            f'db;dur={request_metrics.db_time * 1000:.2f};desc="{request_metrics.queries} queries", '
+            f'serialize;dur={serialize * 1000:.2f}, '
+            f'total;dur={total * 1000:.2f}'
+        )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.metrics_view = view_name(view_func, request.method)
@@ -1,3 +1,4 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.utils import timezone
 
@@ -9,6 +10,9 @@ class BaseModel(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     deleted_at = models.DateTimeField(blank=True, null=True)
 
+    # Fields the soft-delete purge leaves out of ArchivedRecord, for secrets
+    archive_exclude = ()
+
     class Meta:
         abstract = True
 
@@ -20,4 +24,30 @@ class BaseModel(models.Model):
     def is_deleted(self):
         return self.deleted_at is not None
 
+    @classmethod
+    def purgeable(cls, cutoff):
+        """
+        Rows soft-deleted before ``cutoff`` that may be archived and removed,
+        see apps.base.purge. Models whose rows are still referenced elsewhere
+        narrow this down.
+        """
+        return cls.objects.with_deleted().filter(deleted_at__lt=cutoff)
+
     objects = BaseManager()
+
+
+class ArchivedRecord(models.Model):
+    """A row removed by the soft-delete purge, kept as its serialized fields."""
+    model = models.CharField(max_length=100)
+    object_id = models.CharField(max_length=64)
+    data = models.JSONField(encoder=DjangoJSONEncoder)
+    deleted_at = models.DateTimeField(null=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['model', 'object_id'], name='archived_record_lookup_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.model} #{self.object_id}'
@@ -1,7 +1,16 @@
+import binascii
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
 from collections import OrderedDict
+from datetime import datetime
+from decimal import Decimal
 
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination as _CursorPagination
 from rest_framework.pagination import LimitOffsetPagination as _LimitOffsetPagination
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 def get_paginated_response(*, pagination_class, serializer_class, queryset, request, view):
@@ -59,3 +68,148 @@ class LimitOffsetPagination(_LimitOffsetPagination):
             ('previous', self.get_previous_link()),
             ('results', data)
         ]))
+
+
+class KeysetPagination(_CursorPagination):
+    """
+    Cursor pagination that seeks on the full ordering key instead of using
+    ``OFFSET``, so every page costs the same no matter how deep it is.
+
+    The key is the queryset ordering (``OrderingFilter`` or the view's
+    ``ordering``) with ``pk`` appended as a tie breaker. Cursors carry the
+    key values of the row at the edge of the page and are opaque to clients.
+    ``count`` is only computed when ``include_count`` is on and the client
+    does not pass ``count=false``.
+    """
+    page_size = 10
+    max_page_size = 50
+    page_size_query_param = 'limit'
+    ordering = ('-pk',)
+    include_count = True
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.key = self.get_key(queryset, view)
+        self.count = self.get_count(queryset) if self.should_count(request) else None
+
+        cursor = self.decode_cursor(request)
+        reverse = bool(cursor and cursor['r'])
+        if cursor is not None:
+            queryset = queryset.filter(self.seek(cursor['v'], reverse))
+
+        order_by = [self._order_term(field, descending != reverse) for field, descending in self.key]
+        page = list(queryset.order_by(*order_by)[:self.page_size + 1])
+        has_more = len(page) > self.page_size
+        page = page[:self.page_size]
+
+        if reverse:
+            page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+        self.page = page
+        return page
+
+    def get_key(self, queryset, view):
+        ordering = list(queryset.query.order_by) or list(getattr(view, 'ordering', None) or self.ordering)
+        key = []
+        for term in ordering:
+            field = term.lstrip('-')
+            key.append(('pk' if field in ('pk', 'id') else field, term.startswith('-')))
+        if not any(field == 'pk' for field, _ in key):
+            key.append(('pk', key[-1][1] if key else False))
+        return key
+
+    def should_count(self, request):
+        value = request.query_params.get(self.count_query_param, '')
+        if value.lower() in ('0', 'false', 'no'):
+            return False
+        return self.include_count or value.lower() in ('1', 'true', 'yes')
+
+    def get_count(self, queryset):
+        return queryset.order_by().count()
+
+    @staticmethod
+    def _order_term(field, descending):
+        return f'-{field}' if descending else field
+
+    def seek(self, values, reverse):
+        """
+        ``(a, b, c) > (x, y, z)`` spelled out per field so that mixed
+        ascending and descending keys work on every backend.
+        """
+        condition = Q()
+        equal = Q()
+        for (field, descending), value in zip(self.key, values):
+            lookup = 'lt' if descending != reverse else 'gt'
+            condition |= equal & Q(**{f'{field}__{lookup}': value})
+            equal &= Q(**{field: value})
+        return condition
+
+    def _position(self, instance):
+        values = []
+        for field, _ in self.key:
+            value = instance[field] if isinstance(instance, dict) else getattr(instance, field)
+            if isinstance(value, datetime):
+                value = value.isoformat()
+            elif isinstance(value, Decimal):
+                value = str(value)
+            values.append(value)
+        return values
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            cursor = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+            if cursor['k'] != [field for field, _ in self.key] or len(cursor['v']) != len(self.key):
+                raise ValueError
+        except (TypeError, ValueError, KeyError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+    def encode_cursor(self, instance, reverse):
+        cursor = {'k': [field for field, _ in self.key], 'v': self._position(instance), 'r': int(reverse)}
+        encoded = urlsafe_b64encode(json.dumps(cursor, separators=(',', ':')).encode()).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        response_data = OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data)
+        ])
+        if self.count is not None:
+            response_data['count'] = self.count
+            response_data.move_to_end('count', last=False)
+        return Response(response_data)
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties']['count'] = {'type': 'integer', 'example': 123}
+        return response_schema
+
+    def get_schema_operation_parameters(self, view):
+        parameters = super().get_schema_operation_parameters(view)
+        parameters.append({
+            'name': self.count_query_param,
+            'required': False,
+            'in': 'query',
+            'description': 'Set to false to skip counting the total number of results.',
+            'schema': {'type': 'boolean'},
+        })
+        return parameters
@@ -0,0 +1,91 @@
+import logging
+import time
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core import serializers
+from django.db import transaction
+from django.db.models import ProtectedError, RestrictedError
+from django.db.models.deletion import Collector
+from django.utils import timezone
+
+from .models import ArchivedRecord
+
+logger = logging.getLogger(__name__)
+
+
+class SoftDeletePurgeService:
+    """
+    Moves rows soft-deleted more than ``SOFT_DELETE_RETENTION_DAYS`` ago
+    out of the live tables into ArchivedRecord.
+
+    Each model is worked through ``PURGE_BATCH_SIZE`` rows at a time, every
+    batch in its own short transaction: the batch is claimed with ``SELECT
+    ... FOR UPDATE SKIP LOCKED``, so rows someone else holds are left for
+    the next run instead of waited for, then archived together with
+    whatever deleting it cascades to and deleted. Which rows qualify is up
+    to each model's ``purgeable()``, fields listed in its ``archive_exclude``
+    are not archived. A batch that still hits a protected
+    reference is skipped and logged.
+    """
+
+    @classmethod
+    def purge(cls, labels=None, days=None, batch_size=None):
+        """Purge the models in ``labels`` (``PURGE_MODELS`` by default). Returns ``{label: rows}``."""
+        labels = labels or settings.PURGE_MODELS
+        days = settings.SOFT_DELETE_RETENTION_DAYS if days is None else days
+        batch_size = batch_size or settings.PURGE_BATCH_SIZE
+        cutoff = timezone.now() - timedelta(days=days)
+        return {label: cls.purge_model(apps.get_model(label), cutoff, batch_size) for label in labels}
+
+    @classmethod
+    def purge_model(cls, model, cutoff, batch_size):
+        purged = 0
+        skipped = set()
+        while True:
+            with transaction.atomic():
+                pks = list(
+                    model.purgeable(cutoff).exclude(pk__in=skipped)
+                    .select_for_update(skip_locked=True, of=('self',))
+                    .order_by('pk').values_list('pk', flat=True)[:batch_size]
+                )
+                if not pks:
+                    return purged
+                try:
+                    with transaction.atomic():
+                        cls._archive_and_delete(model, pks)
+                except (ProtectedError, RestrictedError):
+                    logger.warning('Not purging %s %s, still referenced', model._meta.label, pks, exc_info=True)
+                    skipped.update(pks)
+                    continue
+            purged += len(pks)
+            if settings.PURGE_BATCH_PAUSE:
+                # Room for replication and other writers between batches
+                time.sleep(settings.PURGE_BATCH_PAUSE)
+
+    @staticmethod
+    def _archived_fields(instance):
+        fields = serializers.serialize('python', [instance])[0]['fields']
+        for name in getattr(instance, 'archive_exclude', ()):
+            fields.pop(name, None)
+        return fields
+
+    @staticmethod
+    def _archive_and_delete(model, pks):
+        collector = Collector(using=model.objects.db)
+        collector.collect(list(model.objects.with_deleted().filter(pk__in=pks)))
+
+        instances = [instance for objs in collector.data.values() for instance in objs]
+        for queryset in collector.fast_deletes:
+            instances.extend(queryset)
+        ArchivedRecord.objects.bulk_create([
+            ArchivedRecord(
+                model=instance._meta.label,
+                object_id=str(instance.pk),
+                data=SoftDeletePurgeService._archived_fields(instance),
+                deleted_at=getattr(instance, 'deleted_at', None),
+            )
+            for instance in instances
+        ])
+        collector.delete()
@@ -0,0 +1,42 @@
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+# Leave datetimes to DRF's encoder so they render exactly as before
+ORJSON_OPTIONS = 0 if orjson is None else orjson.OPT_PASSTHROUGH_DATETIME
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer on top of orjson when it is installed.
+
+    Types orjson does not know (Decimal, datetimes, lazy translation
+    strings, querysets, ...) go through DRF's own encoder, so the bytes are
+    the same as the stock renderer's. Indented output, ``ensure_ascii`` and
+    non-compact separators are left to the stock renderer, as is everything
+    when orjson is missing or gives up on the data.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            # e.g. integers past 64 bits or non-string keys, which json can
+            # still write
+            return super().render(data, accepted_media_type, renderer_context)
+        # Same strict javascript subset escaping as JSONRenderer. Both
+        # characters start with \xe2 in UTF-8, a single byte search is far
+        # cheaper than looking for either sequence on every response
+        if b'\xe2' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
@@ -0,0 +1,123 @@
+import contextvars
+import logging
+import random
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger(__name__)
+
+_current = contextvars.ContextVar('db_routing', default=None)
+
+
+class Routing:
+    """Where the current request reads from, and whether it wrote anything."""
+    __slots__ = ('replica', 'user_id', 'wrote')
+
+    def __init__(self):
+        self.replica = None
+        self.user_id = None
+        self.wrote = False
+
+
+def sticky_key(user_id):
+    return f'replica:sticky:{user_id}'
+
+
+def stick(user_id):
+    """Send ``user_id``'s reads to the primary for the next REPLICA_STICKY_SECONDS."""
+    if not settings.DATABASE_REPLICAS or user_id is None:
+        return
+    try:
+        cache.set(sticky_key(user_id), 1, settings.REPLICA_STICKY_SECONDS)
+    except Exception:
+        logger.warning('Could not pin user %s to the primary', user_id, exc_info=True)
+
+
+def is_sticky(user_id):
+    # When in doubt the primary, it is never behind
+    try:
+        return cache.get(sticky_key(user_id)) is not None
+    except Exception:
+        logger.warning('Could not read the replica stickiness of user %s', user_id, exc_info=True)
+        return True
+
+
+@contextmanager
+def request_scope():
+    """
+    Routing state for one request, started before the user is known. A
+    user who wrote anything inside is pinned to the primary on the way out.
+    """
+    routing = Routing()
+    token = _current.set(routing)
+    try:
+        yield routing
+    finally:
+        _current.reset(token)
+        if routing.wrote:
+            stick(routing.user_id)
+
+
+def route_reads(user, read_only):
+    """Pick a replica for the rest of the current request if it only reads and ``user`` is not pinned."""
+    routing = _current.get()
+    if routing is None:
+        return
+    routing.user_id = user.pk if user and user.is_authenticated else None
+    if not read_only or not settings.DATABASE_REPLICAS:
+        return
+    if routing.user_id is not None and is_sticky(routing.user_id):
+        return
+    routing.replica = random.choice(settings.DATABASE_REPLICAS)
+
+
+@contextmanager
+def primary():
+    """Reads in the block go to the primary, e.g. those that fill a cache."""
+    routing = _current.get()
+    replica = routing and routing.replica
+    if replica is not None:
+        routing.replica = None
+    try:
+        yield
+    finally:
+        if replica is not None:
+            routing.replica = replica
+
+
+class ReplicaRouter:
+    """
+    Writes go to the primary (``default``). Reads go to the replica picked
+    by route_reads() for the request, else to the primary. Within a
+    request, reads return to the primary once it has written something or
+    while it is inside a transaction, and objects keep reading related rows
+    from the database they were loaded from.
+    """
+
+    def db_for_read(self, model, **hints):
+        routing = _current.get()
+        if routing is None or routing.replica is None or routing.wrote:
+            return None
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return routing.replica
+
+    def db_for_write(self, model, **hints):
+        routing = _current.get()
+        if routing is not None:
+            routing.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the primary's rows
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Only the primary, replicas get the schema through replication
+        return None if db == DEFAULT_DB_ALIAS else False
@@ -1,5 +1,163 @@
-from rest_framework import serializers
+import datetime
+import decimal
+from functools import cached_property
+
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import models
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.fields import is_simple_callable
+from rest_framework.settings import api_settings
+
+from .metrics import timed
 
 
 class BaseModelSerializer(serializers.ModelSerializer):
-    pass
+
+    def to_representation(self, instance):
+        with timed('serialize'):
+            return super().to_representation(instance)
+
+
+# Fields whose to_representation() amounts to the builtin for the values a
+# model hands them
+_PLAIN_FIELDS = {
+    serializers.IntegerField: int,
+    serializers.CharField: str,
+    serializers.EmailField: str,
+    serializers.BooleanField: bool,
+}
+
+
+class CompiledSerializer:
+    """
+    Read-only twin of a DRF serializer for hot list and detail endpoints.
+
+    The field tree of ``serializer_class`` is walked once and flattened into
+    ``(name, source_attrs, render)`` entries, so rendering an object is a loop
+    of attribute lookups instead of DRF's per-object field machinery. Leaf
+    fields keep their own ``to_representation`` unless it amounts to a
+    builtin, or to a decimal quantize or ISO timestamp whose settings can be
+    worked out up front, which keeps the output identical to
+    ``serializer_class(obj).data``. Fields that need the serializer context
+    are not supported.
+    """
+    _compiled = {}
+
+    def __init__(self, serializer_class):
+        self.serializer_class = serializer_class
+
+    @classmethod
+    def for_class(cls, serializer_class):
+        if serializer_class not in cls._compiled:
+            cls._compiled[serializer_class] = cls(serializer_class)
+        return cls._compiled[serializer_class]
+
+    @cached_property
+    def _render(self):
+        # Compiled on first use, model fields are not ready at import time
+        return self._compile(self.serializer_class())
+
+    @staticmethod
+    def _timezone():
+        # What DateTimeField.default_timezone() answers, once per call
+        # instead of once per timestamp
+        return timezone.get_current_timezone() if settings.USE_TZ else None
+
+    def to_representation(self, instance):
+        with timed('serialize'):
+            return self._render(instance, self._timezone())
+
+    def many(self, instances):
+        render, tz = self._render, self._timezone()
+        with timed('serialize'):
+            return [render(instance, tz) for instance in instances]
+
+    @classmethod
+    def _compile(cls, serializer):
+        plan = []
+        for field in serializer._readable_fields:
+            if isinstance(field, serializers.ListSerializer):
+                render = cls._compile_many(cls._compile(field.child))
+            elif isinstance(field, serializers.BaseSerializer):
+                render = cls._compile(field)
+            else:
+                render = cls._compile_field(field)
+            plan.append((field.field_name, tuple(field.source_attrs), render))
+        simple_callables = {}
+
+        def render_one(instance, tz):
+            ret = {}
+            for name, attrs, render in plan:
+                value = instance
+                for attr in attrs:
+                    owner = value
+                    try:
+                        value = getattr(owner, attr)
+                    except ObjectDoesNotExist:
+                        value = None
+                        break
+                    if callable(value):
+                        # Same rule as DRF's get_attribute, decided once per
+                        # owner class rather than inspected on every object
+                        key = (type(owner), attr)
+                        if key not in simple_callables:
+                            simple_callables[key] = is_simple_callable(value)
+                        if simple_callables[key]:
+                            value = value()
+                ret[name] = None if value is None else render(value, tz)
+            return ret
+
+        return render_one
+
+    @staticmethod
+    def _compile_many(render_child):
+        def render_many(value, tz):
+            if isinstance(value, models.manager.BaseManager):
+                value = value.all()
+            return [render_child(item, tz) for item in value]
+
+        return render_many
+
+    @staticmethod
+    def _compile_field(field):
+        field_class = type(field)
+        to_representation = field.to_representation
+
+        if field_class in _PLAIN_FIELDS:
+            builtin = _PLAIN_FIELDS[field_class]
+            return lambda value, tz: builtin(value)
+
+        if (
+            field_class is serializers.DecimalField
+            and getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+            and not field.localize and not field.normalize_output
+            and field.decimal_places is not None
+        ):
+            quantum = decimal.Decimal('.1') ** field.decimal_places
+            context = decimal.getcontext().copy()
+            if field.max_digits is not None:
+                context.prec = field.max_digits
+
+            def render_decimal(value, tz):
+                if type(value) is not decimal.Decimal:
+                    return to_representation(value)
+                return '{:f}'.format(value.quantize(quantum, rounding=field.rounding, context=context))
+
+            return render_decimal
+
+        if (
+            field_class is serializers.DateTimeField
+            and (getattr(field, 'format', api_settings.DATETIME_FORMAT) or '').lower() == ISO_8601
+            and not hasattr(field, 'timezone')
+        ):
+            def render_datetime(value, tz):
+                if tz is None or type(value) is not datetime.datetime or value.utcoffset() is None:
+                    return to_representation(value)
+                value = value.astimezone(tz).isoformat()
+                return value[:-6] + 'Z' if value.endswith('+00:00') else value
+
+            return render_datetime
+
+        return lambda value, tz: to_representation(value)
@@ -0,0 +1,9 @@
+from celery import shared_task
+
+from .purge import SoftDeletePurgeService
+
+
+@shared_task
+def purge_soft_deleted():
+    """Scheduled by celery beat, see CELERY_BEAT_SCHEDULE."""
+    return SoftDeletePurgeService.purge()
@@ -1,3 +1,306 @@
-from django.test import TestCase
+from collections import OrderedDict
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest.mock import patch
 
-# Create your tests here.
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase, APITransactionTestCase
+from rest_framework.utils.serializer_helpers import ReturnList
+
+from apps.base import metrics, routers
+from apps.base.db import iterate
+from apps.base.models import ArchivedRecord
+from apps.base.parsers import FastJSONParser
+from apps.base.purge import SoftDeletePurgeService
+from apps.base.renderers import FastJSONRenderer
+from apps.base.throttling import LocalTokenBuckets, parse_rate
+from apps.order.models import Order, OrderIntent, OrderItem
+from apps.order.services import OrderIntentService
+from apps.product.models import Product
+from apps.users.models import Profile, User
+
+
+class MigrationTests(TestCase):
+
+    def test_models_and_migrations_are_in_sync(self):
+        out = StringIO()
+        try:
+            call_command('makemigrations', '--check', '--dry-run', stdout=out)
+        except SystemExit:
+            self.fail(f'Models have changes without a migration:\n{out.getvalue()}')
+
+
+class FastJSONTests(TestCase):
+    payload = {
+        'id': 1,
+        'total_price': Decimal('10.50'),
+        'created_at': datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=dt_timezone.utc),
+        'day': date(2024, 5, 1),
+        'message': gettext_lazy('Not found.'),
+        'name': 'Café\u2028line',
+        'items': ReturnList([OrderedDict(product=2, quantity=3)], serializer=None),
+        'counts': {1: 2},
+        'empty': None,
+    }
+
+    def test_renders_the_same_bytes_as_drf(self):
+        self.assertEqual(FastJSONRenderer().render(self.payload), JSONRenderer().render(self.payload))
+
+    def test_falls_back_for_what_orjson_cannot_encode(self):
+        self.assertEqual(FastJSONRenderer().render({'big': 2 ** 70}), b'{"big":1180591620717411303424}')
+
+    def test_indent_is_honoured(self):
+        rendered = FastJSONRenderer().render({'a': 1}, 'application/json; indent=2')
+        self.assertEqual(rendered, b'{\n  "a": 1\n}')
+
+    def test_stdlib_fallback(self):
+        with patch('apps.base.renderers.orjson', None), patch('apps.base.parsers.orjson', None):
+            self.assertEqual(FastJSONRenderer().render(self.payload), JSONRenderer().render(self.payload))
+            self.assertEqual(FastJSONParser().parse(BytesIO(b'{"a": [1, 2.5]}')), {'a': [1, 2.5]})
+
+    def test_parser(self):
+        self.assertEqual(
+            FastJSONParser().parse(BytesIO('{"name": "Café", "n": 1.5}'.encode())),
+            {'name': 'Café', 'n': 1.5}
+        )
+        with self.assertRaises(ParseError):
+            FastJSONParser().parse(BytesIO(b'{"a": NaN}'))
+        with self.assertRaises(ParseError):
+            FastJSONParser().parse(BytesIO(b'{"a":'))
+
+
+class TokenBucketTests(TestCase):
+
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate('30/min'), (30, 0.5))
+        self.assertEqual(parse_rate('10/s'), (10, 10))
+
+    def test_burst_then_refill(self):
+        buckets = LocalTokenBuckets()
+        with patch('apps.base.throttling.time.monotonic', return_value=100.0) as clock:
+            self.assertEqual([buckets.take('k', 3, 0.5)[0] for _ in range(4)], [True, True, True, False])
+            self.assertEqual(buckets.take('k', 3, 0.5), (False, 2.0))
+            self.assertTrue(buckets.take('other', 3, 0.5)[0])
+
+            clock.return_value = 102.0
+            self.assertEqual(buckets.take('k', 3, 0.5), (True, 0.0))
+            self.assertFalse(buckets.take('k', 3, 0.5)[0])
+
+            # Never more than the capacity however long the bucket sat idle
+            clock.return_value = 10000.0
+            self.assertEqual([buckets.take('k', 3, 0.5)[0] for _ in range(4)], [True, True, True, False])
+
+
+class SoftDeletePurgeTests(TestCase):
+    def setUp(self):
+        self.long_ago = timezone.now() - timedelta(days=90)
+
+    def _deleted(self, model, when=None, **fields):
+        instance = model.objects.create(**fields)
+        model.objects.with_deleted().filter(pk=instance.pk).update(deleted_at=when or self.long_ago)
+        return instance
+
+    def test_old_rows_are_archived_and_removed(self):
+        product = self._deleted(Product, name='Old', price=Decimal('5.00'))
+        recent = self._deleted(Product, when=timezone.now(), name='Recent', price=Decimal('5.00'))
+        live = Product.objects.create(name='Live', price=Decimal('5.00'))
+
+        purged = SoftDeletePurgeService.purge(['product.Product'], days=30, batch_size=1)
+
+        self.assertEqual(purged, {'product.Product': 1})
+        self.assertEqual(
+            set(Product.objects.with_deleted().values_list('pk', flat=True)), {recent.pk, live.pk}
+        )
+        record = ArchivedRecord.objects.get()
+        self.assertEqual((record.model, record.object_id), ('product.Product', str(product.pk)))
+        self.assertEqual(record.data['name'], 'Old')
+        self.assertEqual(record.data['price'], '5.00')
+        self.assertIsNotNone(record.deleted_at)
+
+    def test_rows_still_referenced_are_kept(self):
+        customer = self._deleted(User, username='gone', email='gone@example.com')
+        product = self._deleted(Product, name='Ordered', price=Decimal('5.00'))
+        order = Order.objects.create(customer=customer, total_price=Decimal('5.00'))
+        OrderItem.objects.create(order=order, product=product, quantity=1, price=Decimal('5.00'))
+
+        self.assertEqual(
+            SoftDeletePurgeService.purge(['product.Product', 'users.User'], days=30),
+            {'product.Product': 0, 'users.User': 0},
+        )
+        self.assertFalse(ArchivedRecord.objects.exists())
+
+    def test_cascaded_rows_are_archived_too(self):
+        user = self._deleted(User, username='gone', email='gone@example.com')
+        Profile.objects.create(user=user, first_name='Gone')
+
+        call_command('purge_soft_deleted', 'users.User', '--days', '30', stdout=StringIO())
+
+        self.assertFalse(User.objects.with_deleted().exists())
+        self.assertFalse(Profile.objects.with_deleted().exists())
+        self.assertEqual(
+            sorted(ArchivedRecord.objects.values_list('model', flat=True)), ['users.Profile', 'users.User']
+        )
+
+    def test_archived_users_keep_no_password_hash(self):
+        self._deleted(User, username='gone', email='gone@example.com', password=make_password('Secret123!'))
+
+        SoftDeletePurgeService.purge(['users.User'], days=30)
+
+        data = ArchivedRecord.objects.get(model='users.User').data
+        self.assertEqual(data['username'], 'gone')
+        self.assertNotIn('password', data)
+
+
+class MetricsTests(APITestCase):
+    def setUp(self):
+        metrics.get_store().clear()
+        self.user = User.objects.create_user(username='metrics', email='metrics@admin.com', password='testpass')
+        self.client.force_authenticate(user=self.user)
+
+    def test_server_timing_header(self):
+        response = self.client.get('/api/products/')
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'^db;dur=[\d.]+;desc="[1-9]\d* queries", serialize;dur=[\d.]+, total;dur=[\d.]+$')
+
+    @override_settings(METRICS_TOKEN='scrape-token')
+    def test_requests_are_aggregated_per_view(self):
+        self.client.get('/api/products/')
+        self.client.get('/api/products/')
+        self.client.post('/api/products/', {}, format='json')
+
+        body = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-token').content.decode()
+        labels = 'view="ProductViewSet.list",method="GET"'
+        self.assertIn(f'http_request_duration_seconds_count{{{labels}}} 2', body)
+        self.assertIn(f'http_request_queries_bucket{{{labels},le="+Inf"}} 2', body)
+        self.assertIn(f'http_requests_total{{{labels},status="200"}} 2', body)
+        self.assertIn('view="ProductViewSet.create",method="POST",status="403"', body)
+
+    @override_settings(METRICS_TOKEN='scrape-token')
+    def test_metrics_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-token')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+
+    def test_metrics_are_off_without_a_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
+        with override_settings(DEBUG=True):
+            self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+    def test_histogram_buckets_are_cumulative(self):
+        store = metrics.MetricsStore()
+        store.record([('http_request_queries', 'view="v",method="GET"', 2)] * 2, [])
+        store.record([('http_request_queries', 'view="v",method="GET"', 30)], [])
+        body = metrics.render(store.snapshot())
+        self.assertIn('http_request_queries_bucket{view="v",method="GET",le="1"} 0', body)
+        self.assertIn('http_request_queries_bucket{view="v",method="GET",le="2"} 2', body)
+        self.assertIn('http_request_queries_bucket{view="v",method="GET",le="50"} 3', body)
+        self.assertIn('http_request_queries_sum{view="v",method="GET"} 34', body)
+
+    def test_nested_timings_count_once(self):
+        request_metrics, token = metrics.start_request()
+        try:
+            with patch('apps.base.metrics.time.perf_counter', side_effect=[1.0, 2.0, 5.0]):
+                with metrics.timed('serialize'):
+                    with metrics.timed('serialize'):
+                        pass
+        finally:
+            metrics.end_request(token)
+        self.assertEqual(request_metrics.timings['serialize'], 4.0)
+
+
+class ConnectionTests(TestCase):
+    def setUp(self):
+        Product.objects.bulk_create(Product(name=f'p{i}', price=1, quantity=1) for i in range(5))
+
+    def test_iterate_pages_by_key_without_server_side_cursors(self):
+        queryset = Product.objects.order_by('-name')
+        with patch.dict(connection.settings_dict, {'DISABLE_SERVER_SIDE_CURSORS': True}):
+            with CaptureQueriesContext(connection) as queries:
+                products = list(iterate(queryset, chunk_size=2))
+        self.assertEqual(products, list(Product.objects.order_by('pk')))
+        # Two full pages and a short last one
+        self.assertEqual(len(queries), 3)
+        self.assertIn('LIMIT 2', queries[-1]['sql'])
+
+    def test_iterate_uses_the_queryset_iterator_otherwise(self):
+        queryset = Product.objects.order_by('-name')
+        self.assertEqual(list(iterate(queryset, chunk_size=2)), list(queryset))
+
+    def test_celery_workers_close_obsolete_connections_after_tasks(self):
+        from celery.fixups.django import DjangoFixup, DjangoWorkerFixup
+        from order_management.celery import app
+
+        self.assertTrue(any(isinstance(fixup, DjangoFixup) for fixup in app._fixups))
+        with patch.object(type(connections['default']), 'close_if_unusable_or_obsolete') as close:
+            DjangoWorkerFixup(app).close_database()
+        close.assert_called()
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(APITransactionTestCase):
+    # Committed rows, so the replica's connection sees them like a replica would
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='replica', email='replica@admin.com', password='testpass')
+        self.other = User.objects.create_user(username='replica2', email='replica2@admin.com', password='testpass')
+        self.product = Product.objects.create(name='p', price=10, quantity=100)
+        self.client.force_authenticate(user=self.user)
+
+    def _request(self, method, *args, **kwargs):
+        """The response and the number of queries it ran on the primary and on the replica."""
+        with CaptureQueriesContext(connections['default']) as on_primary, \
+                CaptureQueriesContext(connections['replica']) as on_replica:
+            response = getattr(self.client, method)(*args, **kwargs)
+        return response, len(on_primary), len(on_replica)
+
+    def test_reads_go_to_the_replica(self):
+        for url in ('/api/orders/', '/api/products/', f'/api/products/{self.product.pk}/'):
+            response, on_primary, on_replica = self._request('get', url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(on_primary, 0, url)
+            self.assertGreater(on_replica, 0, url)
+
+    def test_a_write_pins_its_user_to_the_primary(self):
+        items = [{'product_id': self.product.pk, 'quantity': 1}]
+        response, on_primary, on_replica = self._request('post', '/api/orders/', {'items': items}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertGreater(on_primary, 0)
+        self.assertEqual(on_replica, 0)
+
+        response, on_primary, on_replica = self._request('get', '/api/orders/')
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertGreater(on_primary, 0)
+        self.assertEqual(on_replica, 0)
+
+        # Only the writer is pinned, and only for REPLICA_STICKY_SECONDS
+        self.client.force_authenticate(user=self.other)
+        self.assertEqual(self._request('get', '/api/orders/')[1], 0)
+        cache.delete(routers.sticky_key(self.user.pk))
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(self._request('get', '/api/orders/')[1], 0)
+
+    def test_queued_orders_pin_their_customer_once_placed(self):
+        OrderIntent.objects.create(customer=self.user, items=[{'product_id': self.product.pk, 'quantity': 1}])
+        self.assertFalse(routers.is_sticky(self.user.pk))
+        self.assertEqual(OrderIntentService.process_batch(), 1)
+        self.assertTrue(routers.is_sticky(self.user.pk))
+
+    @override_settings(PRODUCT_CACHE_ENABLED=True)
+    def test_the_product_cache_is_filled_from_the_primary(self):
+        response, on_primary, on_replica = self._request('get', f'/api/products/{self.product.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(on_primary, 0)
+        self.assertEqual(on_replica, 0)
@@ -0,0 +1,143 @@
+import logging
+import math
+import threading
+import time
+
+from django.conf import settings
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import BaseThrottle
+
+logger = logging.getLogger(__name__)
+
+# KEYS[1] bucket, ARGV capacity, refill rate (tokens per second) and cost.
+# The clock is Redis' own so app servers with skewed clocks share buckets
+# fairly. Returns whether the request is let through and, when it is not,
+# the seconds until enough tokens are back (as a string, Lua numbers would
+# come back truncated to integers).
+TOKEN_BUCKET_LUA = """
+redis.replicate_commands()
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+
+local allowed = 0
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+return {allowed, tostring(wait)}
+"""
+
+
+class RedisTokenBuckets:
+    """Token buckets in Redis, one EVALSHA per check."""
+
+    def __init__(self, client):
+        self._script = client.register_script(TOKEN_BUCKET_LUA)
+
+    def take(self, key, capacity, rate, cost=1):
+        allowed, wait = self._script(keys=[key], args=[capacity, rate, cost])
+        return bool(int(allowed)), float(wait)
+
+
+class LocalTokenBuckets:
+    """
+    The same buckets kept in this process, for cache backends other than
+    Redis (development, tests). Limits are per process with these.
+    """
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, rate, cost=1):
+        now = time.monotonic()
+        with self._lock:
+            tokens, ts = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + max(0.0, now - ts) * rate)
+            if tokens >= cost:
+                self._buckets[key] = (tokens - cost, now)
+                return True, 0.0
+            self._buckets[key] = (tokens, now)
+            return False, (cost - tokens) / rate
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+def parse_rate(rate):
+    """``'30/min'`` -> ``(30, 0.5)``: bucket capacity and tokens refilled per second."""
+    count, period = rate.split('/')
+    seconds = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[period[0]]
+    return int(count), int(count) / seconds
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Rate limits writes per user (per client address for anonymous
+    requests) and per ``throttle_scope`` of the view, with the limits of
+    the user's tier in ``settings.RATE_LIMITS``:
+
+        RATE_LIMITS = {'orders': {'admin': '600/min', 'customer': '30/min', 'anon': None}}
+
+    A rate of ``N/period`` lets a burst of N requests through and refills
+    at N per period. Views without a scope, reads and tiers without a rate
+    are not limited. Should Redis be unreachable requests are let through
+    rather than failed.
+    """
+    _buckets = None
+
+    @classmethod
+    def buckets(cls):
+        if cls._buckets is None:
+            try:
+                from django_redis import get_redis_connection
+                cls._buckets = RedisTokenBuckets(get_redis_connection('default'))
+            except (ImportError, NotImplementedError):
+                cls._buckets = LocalTokenBuckets()
+        return cls._buckets
+
+    @staticmethod
+    def get_tier(request):
+        user = request.user
+        if not user or not user.is_authenticated:
+            return 'anon'
+        return 'admin' if user.is_admin else 'customer'
+
+    def allow_request(self, request, view):
+        self._wait = None
+        scope = getattr(view, 'throttle_scope', None)
+        if not settings.RATE_LIMIT_ENABLED or scope is None or request.method in SAFE_METHODS:
+            return True
+        tier = self.get_tier(request)
+        rate = settings.RATE_LIMITS.get(scope, {}).get(tier)
+        if rate is None:
+            return True
+
+        ident = request.user.pk if tier != 'anon' else self.get_ident(request)
+        capacity, refill = parse_rate(rate)
+        try:
+            allowed, wait = self.buckets().take(f'ratelimit:{scope}:{tier}:{ident}', capacity, refill)
+        except Exception:
+            logger.warning('Rate limit check failed, letting the request through', exc_info=True)
+            return True
+        if not allowed:
+            self._wait = wait
+        return allowed
+
+    def wait(self):
+        # Retry-After is rendered as whole seconds
+        return math.ceil(self._wait) if self._wait else None
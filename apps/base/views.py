@@ -1,7 +1,19 @@
+import hashlib
 from abc import ABC, abstractmethod
 
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Count, Max
+from django.http import Http404, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.crypto import constant_time_compare
+from django.utils.http import http_date
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet
 
+from . import metrics, routers
+from .serializers import CompiledSerializer
 from .services import BaseService
 
 
@@ -14,3 +26,126 @@ class BaseViewSet(ABC, GenericViewSet):
     @abstractmethod
     def _get_service(self) -> BaseService:
         pass
+
+
+class ReplicaReadMixin:
+    """
+    Serves safe-method requests from a read replica unless the user wrote
+    something within REPLICA_STICKY_SECONDS, and pins users whose request
+    wrote to the primary for that long (see apps.base.routers).
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        with routers.request_scope():
+            return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        # Authenticates, so the user is known from here on
+        super().initial(request, *args, **kwargs)
+        routers.route_reads(request.user, request.method in SAFE_METHODS)
+
+
+class CompiledReadMixin:
+    """
+    Renders list and retrieve through the compiled twin of the view's
+    serializer class (see CompiledSerializer); same payload, less CPU.
+    """
+
+    def get_read_serializer(self):
+        return CompiledSerializer.for_class(self.get_serializer_class())
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.get_read_serializer().many(page))
+        return Response(self.get_read_serializer().many(queryset))
+
+    def retrieve(self, request, *args, **kwargs):
+        return Response(self.get_read_serializer().to_representation(self.get_object()))
+
+
+class ConditionalGetMixin:
+    """
+    ETag on list and retrieve, Last-Modified on retrieve only. The
+    validators come from one aggregate query, the newest of
+    ``last_modified_fields`` and the number of distinct ``count_fields``
+    over the rows the response is built from, so a matching
+    ``If-None-Match`` (or ``If-Modified-Since``) gets a 304 without loading
+    or serializing anything. A list has no Last-Modified: its newest
+    timestamp stays put when a row leaves the result, only the ETag's
+    count notices.
+
+    ``last_modified_fields`` have to cover whatever the serializer nests,
+    otherwise a change to a nested object would not change the ETag.
+    """
+    last_modified_fields = ('updated_at',)
+    count_fields = ('pk',)
+
+    def get_validators(self, queryset, allow_empty=True):
+        """``(etag, last_modified)`` for the rows of ``queryset``."""
+        aggregates = {f'modified_{i}': Max(field) for i, field in enumerate(self.last_modified_fields)}
+        aggregates.update({f'count_{i}': Count(field, distinct=True) for i, field in enumerate(self.count_fields)})
+        values = queryset.order_by().aggregate(**aggregates)
+        if not values['count_0'] and not allow_empty:
+            return None, None
+        parts = [values[key] for key in sorted(values)]
+        stamps = [value for key, value in values.items() if key.startswith('modified_') and value is not None]
+        return self.make_etag(*parts), max(stamps, default=None)
+
+    def make_etag(self, *parts):
+        """An ETag for ``parts`` as seen by this user at this URL."""
+        key = repr((self.request.get_full_path(), self.request.user.pk) + parts)
+        return '"%s"' % hashlib.md5(key.encode()).hexdigest()
+
+    def conditional_response(self, etag, last_modified, respond):
+        """The 304 (or 412) the request's conditions call for, else ``respond()`` with the validators set."""
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        if etag is not None:
+            response = get_conditional_response(self.request, etag=etag, last_modified=timestamp)
+            if response is not None:
+                return response
+        response = respond()
+        if etag is not None and response.status_code == 200:
+            response['ETag'] = etag
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        should_count = getattr(self.paginator, 'should_count', None)
+        if should_count is not None and not should_count(request):
+            # The validator scans the whole result like the count does, a
+            # client skipping the count for speed skips the ETag as well
+            return super().list(request, *args, **kwargs)
+        etag, _ = self.get_validators(self.filter_queryset(self.get_queryset()))
+        respond = super().list
+        return self.conditional_response(etag, None, lambda: respond(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            queryset = self.filter_queryset(self.get_queryset()).filter(
+                **{self.lookup_field: kwargs[lookup_url_kwarg]}
+            )
+            # Missing objects go on to the usual 404
+            etag, last_modified = self.get_validators(queryset, allow_empty=False)
+        except (TypeError, ValueError, DjangoValidationError):
+            etag = last_modified = None
+        respond = super().retrieve
+        return self.conditional_response(etag, last_modified, lambda: respond(request, *args, **kwargs))
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint, behind ``Authorization: Bearer <METRICS_TOKEN>``.
+    Without a token configured it is not there at all, unless DEBUG is on.
+    """
+    if not settings.METRICS_TOKEN:
+        if not settings.DEBUG:
+            raise Http404
+    elif not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {settings.METRICS_TOKEN}'):
+        return HttpResponse(status=401)
+    return HttpResponse(
+        metrics.render(metrics.get_store().snapshot()), content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
@@ -0,0 +1,61 @@
+import csv
+import json
+
+CSV_COLUMNS = [
+    'order_id', 'customer_id', 'customer_username', 'status', 'total_price', 'created_at', 'updated_at',
+    'product_id', 'product_name', 'quantity', 'price',
+]
+
+
+class Echo:
+    """File-like object whose write() hands the row back to csv.writer's caller."""
+
+    def write(self, value):
+        return value
+
+
+def _order_row(order):
+    return {
+        'id': order.id,
+        'customer_id': order.customer_id,
+        'customer_username': order.customer.username,
+        'status': order.status,
+        'total_price': str(order.total_price),
+        'created_at': order.created_at.isoformat(),
+        'updated_at': order.updated_at.isoformat(),
+        'items': [
+            {
+                'product_id': item.product_id,
+                'product_name': item.product.name,
+                'quantity': item.quantity,
+                'price': str(item.price),
+            }
+            for item in order.items.all()
+        ],
+    }
+
+
+def write_ndjson(orders):
+    """One JSON object per order, items nested."""
+    for order in orders:
+        yield json.dumps(_order_row(order), ensure_ascii=False) + '\n'
+
+
+def write_csv(orders):
+    """One row per order item, the order columns repeated on each of its rows."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_COLUMNS)
+    for order in orders:
+        row = _order_row(order)
+        head = [
+            row['id'], row['customer_id'], row['customer_username'], row['status'], row['total_price'],
+            row['created_at'], row['updated_at'],
+        ]
+        for item in row['items']:
+            yield writer.writerow(head + [item['product_id'], item['product_name'], item['quantity'], item['price']])
+
+
+WRITERS = {
+    'ndjson': (write_ndjson, 'application/x-ndjson'),
+    'csv': (write_csv, 'text/csv'),
+}
@@ -2,14 +2,34 @@
 import django_filters
 from .models import Order
 from django.db.models import Q
+from .services import OrderService
 
 
 class OrderFilter(django_filters.FilterSet):
-    date_range = django_filters.DateFromToRangeFilter(field_name='created_at')
+    date_range = django_filters.DateFromToRangeFilter(field_name='created_at', method='filter_date_range')
     min_price = django_filters.NumberFilter(field_name='total_price', lookup_expr='gte')
     max_price = django_filters.NumberFilter(field_name='total_price', lookup_expr='lte')
-    status = django_filters.CharFilter(lookup_expr='iexact')
+    status = django_filters.CharFilter(method='filter_status')
 
     class Meta:
         model = Order
-        fields = ['status', 'created_at', 'total_price']
\ No newline at end of file
+        fields = ['status', 'created_at', 'total_price']
+
+    def filter_status(self, queryset, name, value):
+        # Statuses are stored upper case; an exact match can use the
+        # (status, created_at) index where iexact could not.
+        return queryset.filter(status=value.upper())
+
+    def filter_date_range(self, queryset, name, value):
+        return queryset.filter(**OrderService.date_range_lookups('created_at', value))
+
+    @classmethod
+    def created_range(cls, data):
+        """
+        The ``date_range`` in ``data`` as a slice, None when absent or
+        invalid, for OrderService.get_queryset() to bound the items with.
+        """
+        form = cls(data).form
+        if not form.is_valid():
+            return None
+        return form.cleaned_data.get('date_range')
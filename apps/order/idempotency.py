@@ -0,0 +1,182 @@
+import hashlib
+import json
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response as _Response
+
+from .models import IdempotencyKey
+from ..base.responses import Response
+
+logger = logging.getLogger(__name__)
+
+# Response headers worth replaying, e.g. where a queued order can be followed
+REPLAYED_HEADERS = ('Location',)
+
+
+class IdempotencyService:
+    """
+    ``Idempotency-Key`` handling for order creation.
+
+    The first request with a key runs, and when it succeeds its response
+    is stored in the same transaction as the order it created: a unique
+    ``(customer, key)`` row is what guarantees an order is placed once.
+    Retries are answered from that row, or from the cache in front of it,
+    without touching the order or product tables.
+
+    A duplicate arriving while the first request still runs waits for it
+    on a short lived lock in the cache. Should the cache be unavailable
+    both run, and the one that commits second hits the unique row, rolls
+    its order back and replays the first one's response.
+
+    Only successful responses are stored; a request that failed can be
+    retried with the same key. Keys expire after ``IDEMPOTENCY_KEY_TTL``,
+    in the database as in the cache: an older key runs as a new request,
+    and purge_expired() deletes the stale rows.
+    """
+    header = 'Idempotency-Key'
+    max_key_length = 255
+    poll_interval = 0.05
+
+    @classmethod
+    def run(cls, request, respond):
+        """Answer ``request`` with ``respond()`` once per key, replaying it for retries."""
+        key = request.headers.get(cls.header)
+        if not key:
+            return respond()
+        if len(key) > cls.max_key_length:
+            return Response(
+                {'error': f'{cls.header} must be at most {cls.max_key_length} characters'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        user = request.user
+        fingerprint = cls._fingerprint(request)
+        cache_key = cls._cache_key(user.pk, key)
+        deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT
+        while not cls._lock(cache_key):
+            stored = cls._stored(user, key, cache_key)
+            if stored is not None:
+                return cls._replay(stored, fingerprint)
+            if time.monotonic() >= deadline:
+                return Response(
+                    {'error': f'A request with this {cls.header} is still being processed'},
+                    status=status.HTTP_409_CONFLICT
+                )
+            time.sleep(cls.poll_interval)
+
+        try:
+            # Looked up under the lock, so a request that just finished is
+            # replayed rather than run again
+            stored = cls._stored(user, key, cache_key)
+            if stored is not None:
+                return cls._replay(stored, fingerprint)
+            return cls._run_once(user, key, fingerprint, cache_key, respond)
+        finally:
+            cls._cache_call('delete', f'{cache_key}:lock')
+
+    @classmethod
+    def _run_once(cls, user, key, fingerprint, cache_key, respond):
+        try:
+            with transaction.atomic():
+                response = respond()
+                if not status.is_success(response.status_code):
+                    stored = None
+                else:
+                    stored = {
+                        'fingerprint': fingerprint,
+                        'status_code': response.status_code,
+                        'response': json.loads(json.dumps(response.data, cls=DjangoJSONEncoder)),
+                        'headers': {name: response[name] for name in REPLAYED_HEADERS if response.has_header(name)},
+                    }
+                    # An expired row would still hold the unique (customer, key)
+                    IdempotencyKey.objects.filter(customer=user, key=key, created_at__lt=cls._cutoff()).delete()
+                    IdempotencyKey.objects.create(customer=user, key=key, **stored)
+        except IntegrityError:
+            # A concurrent duplicate committed first, this order was rolled back
+            stored = cls._stored(user, key, cache_key)
+            if stored is None:
+                raise
+            return cls._replay(stored, fingerprint)
+
+        if stored is None:
+            # A failure that a concurrent duplicate may have raced into
+            # (e.g. the stock it had just taken) is answered with its result
+            stored = cls._stored(user, key, cache_key)
+            return response if stored is None else cls._replay(stored, fingerprint)
+
+        cls._cache_call('set', cache_key, stored, settings.IDEMPOTENCY_KEY_TTL)
+        return response
+
+    @classmethod
+    def _stored(cls, user, key, cache_key):
+        stored = cls._cache_call('get', cache_key)
+        if stored is not None:
+            return stored
+        record = IdempotencyKey.objects.filter(customer=user, key=key, created_at__gte=cls._cutoff()).values(
+            'fingerprint', 'status_code', 'response', 'headers'
+        ).first()
+        if record is not None:
+            cls._cache_call('set', cache_key, record, settings.IDEMPOTENCY_KEY_TTL)
+        return record
+
+    @staticmethod
+    def _cutoff():
+        return timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+
+    @classmethod
+    def purge_expired(cls, batch_size=None):
+        """Delete the keys older than ``IDEMPOTENCY_KEY_TTL``, ``batch_size`` at a time. Returns the count."""
+        batch_size = batch_size or settings.PURGE_BATCH_SIZE
+        cutoff = cls._cutoff()
+        purged = 0
+        while True:
+            expired = IdempotencyKey.objects.filter(created_at__lt=cutoff).order_by('pk')
+            pks = list(expired.values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                return purged
+            purged += IdempotencyKey.objects.filter(pk__in=pks).delete()[0]
+
+    @classmethod
+    def _replay(cls, stored, fingerprint):
+        if stored['fingerprint'] != fingerprint:
+            return Response(
+                {'error': f'{cls.header} was already used for a different request'},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY
+            )
+        headers = dict(stored['headers'], **{'Idempotent-Replayed': 'true'})
+        return _Response(stored['response'], status=stored['status_code'], headers=headers)
+
+    @classmethod
+    def _lock(cls, cache_key):
+        acquired = cls._cache_call('add', f'{cache_key}:lock', 1, settings.IDEMPOTENCY_LOCK_TIMEOUT)
+        # Without the cache every request goes ahead, the unique row still
+        # keeps duplicates from being placed
+        return acquired is not False
+
+    @staticmethod
+    def _cache_call(method, *args):
+        try:
+            return getattr(cache, method)(*args)
+        except Exception:
+            logger.warning('Idempotency cache unavailable for %s', method, exc_info=True)
+            return None
+
+    @staticmethod
+    def _cache_key(user_pk, key):
+        return f'idempotency:{user_pk}:{hashlib.sha256(key.encode()).hexdigest()}'
+
+    @staticmethod
+    def _fingerprint(request):
+        data = request.data
+        if hasattr(data, 'lists'):
+            data = dict(data.lists())
+        payload = [request.method, request.path, sorted(request.query_params.lists()), data]
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, cls=DjangoJSONEncoder).encode()).hexdigest()
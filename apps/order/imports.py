@@ -0,0 +1,222 @@
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+from itertools import groupby, islice
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Order, OrderItem
+from ..base.exceptions import NotEnoughStock
+from ..product.models import Product
+from ..product.services import StockService
+from ..users.models import User
+
+ORDER_STATUSES = {status for status, _ in Order.ORDER_STATUS}
+
+
+class RejectedRecord(Exception):
+    pass
+
+
+def read_jsonl(lines):
+    """
+    One order per line:
+    {"customer_id": 1, "status": "COMPLETED", "created_at": "2024-01-01T10:00:00Z",
+     "items": [{"product_id": 1, "quantity": 2, "price": "10.00"}]}
+    ``status``, ``created_at`` and item ``price`` are optional.
+    """
+    for line_no, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield line_no, json.loads(line)
+        except ValueError:
+            yield line_no, RejectedRecord('Invalid JSON')
+
+
+def read_csv(lines):
+    """
+    One order item per row with the columns
+    ``order_ref,customer_id,product_id,quantity[,price][,status][,created_at]``.
+    Consecutive rows sharing an ``order_ref`` make up one order.
+    """
+    rows = enumerate(csv.DictReader(lines), start=2)
+    for _, group in groupby(rows, key=lambda row: row[1].get('order_ref')):
+        group = list(group)
+        line_no, first = group[0]
+        yield line_no, {
+            'customer_id': first.get('customer_id'),
+            'status': first.get('status') or None,
+            'created_at': first.get('created_at') or None,
+            'items': [
+                {'product_id': row.get('product_id'), 'quantity': row.get('quantity'), 'price': row.get('price') or None}
+                for _, row in group
+            ],
+        }
+
+
+READERS = {
+    'jsonl': read_jsonl,
+    'csv': read_csv,
+}
+
+
+class OrderImporter:
+    """
+    Streams orders into the database ``chunk_size`` records at a time, so
+    memory stays flat however large the file is.
+
+    Each chunk resolves its customers and products with one query each,
+    locks and checks the stock of the chunk's products once, takes it with
+    StockService's set-based updates and inserts orders and items with
+    ``bulk_create``. Records that cannot be imported are handed to
+    ``reject`` (``reject(line_no, error, record)``) and do not affect the rest
+    of the chunk.
+    """
+
+    def __init__(self, chunk_size=1000, adjust_stock=True, reject=None):
+        self.chunk_size = chunk_size
+        self.adjust_stock = adjust_stock
+        self._reject_callback = reject
+        self.result = {'orders': 0, 'items': 0, 'rejected': 0}
+
+    def run(self, lines, file_format='jsonl'):
+        records = READERS[file_format](lines)
+        while True:
+            chunk = list(islice(records, self.chunk_size))
+            if not chunk:
+                return self.result
+            self._import_chunk(chunk)
+
+    def _reject(self, line_no, error, record):
+        self.result['rejected'] += 1
+        if self._reject_callback is not None:
+            self._reject_callback(line_no, error, record)
+
+    def _clean(self, record):
+        if isinstance(record, RejectedRecord):
+            raise record
+        if not isinstance(record, dict):
+            raise RejectedRecord('Record must be an object')
+        try:
+            customer_id = int(record['customer_id'])
+            items = [
+                {
+                    'product_id': int(item['product_id']),
+                    'quantity': int(item['quantity']),
+                    'price': Decimal(str(item['price'])) if item.get('price') is not None else None,
+                }
+                for item in record['items']
+            ]
+        except (KeyError, TypeError, ValueError, InvalidOperation):
+            raise RejectedRecord('customer_id and items with product_id and quantity are required')
+        if not items:
+            raise RejectedRecord('At least one product is required')
+        if any(item['quantity'] <= 0 for item in items):
+            raise RejectedRecord('Quantity must be at least 1')
+
+        status = (record.get('status') or 'PENDING').upper()
+        if status not in ORDER_STATUSES:
+            raise RejectedRecord(f'Invalid status {status}')
+
+        created_at = None
+        if record.get('created_at'):
+            created_at = parse_datetime(str(record['created_at']))
+            if created_at is None:
+                raise RejectedRecord('Invalid created_at')
+            if timezone.is_naive(created_at):
+                created_at = timezone.make_aware(created_at)
+
+        return {'customer_id': customer_id, 'status': status, 'created_at': created_at, 'items': items}
+
+    def _import_chunk(self, chunk):
+        records = []
+        for line_no, record in chunk:
+            try:
+                records.append((line_no, record, self._clean(record)))
+            except RejectedRecord as e:
+                self._reject(line_no, str(e), record)
+        if not records:
+            return
+
+        customer_ids = {cleaned['customer_id'] for _, _, cleaned in records}
+        product_ids = {item['product_id'] for _, _, cleaned in records for item in cleaned['items']}
+        customers = set(User.objects.filter(pk__in=customer_ids).values_list('pk', flat=True))
+
+        accepted = []
+        try:
+            with transaction.atomic():
+                products = {
+                    product.pk: product
+                    for product in Product.objects.filter(pk__in=product_ids)
+                    .select_for_update().only('id', 'price', 'quantity').order_by('pk')
+                }
+                demand = self._allocate(records, customers, products, accepted)
+                if self.adjust_stock:
+                    StockService.adjust(demand)
+                self._insert(accepted, products)
+        except NotEnoughStock as e:
+            # Only possible if the stock moved underneath the chunk
+            for cleaned in accepted:
+                self._reject(cleaned['line_no'], e.message, cleaned['record'])
+
+    def _allocate(self, records, customers, products, accepted):
+        stock = {pk: product.quantity for pk, product in products.items()}
+        demand = {}
+        for line_no, record, cleaned in records:
+            if cleaned['customer_id'] not in customers:
+                self._reject(line_no, f"Unknown customer {cleaned['customer_id']}", record)
+                continue
+            wanted = {}
+            for item in cleaned['items']:
+                wanted[item['product_id']] = wanted.get(item['product_id'], 0) + item['quantity']
+            missing = sorted(pk for pk in wanted if pk not in products)
+            if missing:
+                self._reject(line_no, f"Unknown product(s) {', '.join(map(str, missing))}", record)
+                continue
+            if self.adjust_stock:
+                short = sorted(pk for pk, quantity in wanted.items() if stock[pk] < quantity)
+                if short:
+                    self._reject(line_no, f"Not enough stock for product(s) {', '.join(map(str, short))}", record)
+                    continue
+                for pk, quantity in wanted.items():
+                    stock[pk] -= quantity
+                    demand[pk] = demand.get(pk, 0) + quantity
+            accepted.append(dict(cleaned, line_no=line_no, record=record))
+        return demand
+
+    def _insert(self, accepted, products):
+        orders = []
+        for cleaned in accepted:
+            for item in cleaned['items']:
+                if item['price'] is None:
+                    item['price'] = products[item['product_id']].price
+            orders.append(Order(
+                customer_id=cleaned['customer_id'],
+                status=cleaned['status'],
+                total_price=sum(item['price'] * item['quantity'] for item in cleaned['items']),
+            ))
+        Order.objects.bulk_create(orders, batch_size=self.chunk_size)
+
+        # auto_now_add overrides created_at on insert, historical timestamps
+        # are written back in one statement per chunk, before the items copy
+        # them into order_created_at
+        backdated = []
+        for order, cleaned in zip(orders, accepted):
+            if cleaned['created_at'] is not None:
+                order.created_at = cleaned['created_at']
+                backdated.append(order)
+        if backdated:
+            Order.objects.bulk_update(backdated, ['created_at'], batch_size=self.chunk_size)
+
+        items = [
+            OrderItem(order=order, product_id=item['product_id'], quantity=item['quantity'], price=item['price'])
+            for order, cleaned in zip(orders, accepted)
+            for item in cleaned['items']
+        ]
+        OrderItem.objects.bulk_create(items, batch_size=self.chunk_size)
+
+        self.result['orders'] += len(orders)
+        self.result['items'] += len(items)
@@ -0,0 +1,45 @@
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.order.imports import READERS, OrderImporter
+
+
+class Command(BaseCommand):
+    help = 'Stream a JSONL or CSV file of orders into the database in chunks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import, .jsonl or .csv')
+        parser.add_argument('--format', choices=sorted(READERS), help='Defaults to the file extension')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--rejects', help='Where to write rejected records (JSONL), defaults to <path>.rejects.jsonl')
+        parser.add_argument('--skip-stock', action='store_true', help='Do not take stock for the imported orders')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        if file_format not in READERS:
+            raise CommandError(f'Unknown format {file_format!r}, use --format')
+        rejects_path = options['rejects'] or f'{path}.rejects.jsonl'
+
+        started = time.monotonic()
+        with open(path, newline='', encoding='utf-8') as source, open(rejects_path, 'w', encoding='utf-8') as rejects:
+            def reject(line_no, error, record):
+                rejects.write(json.dumps({'line': line_no, 'error': error, 'record': record}, default=str) + '\n')
+
+            importer = OrderImporter(
+                chunk_size=options['chunk_size'],
+                adjust_stock=not options['skip_stock'],
+                reject=reject,
+            )
+            result = importer.run(source, file_format)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result['orders']} orders ({result['items']} items) in {elapsed:.1f}s, "
+            f"{result['rejected']} rejected"
+        ))
+        if result['rejected']:
+            self.stdout.write(f'Rejected records were written to {rejects_path}')
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.order.partitions import OrderPartitionService
+
+
+class Command(BaseCommand):
+    help = 'Create upcoming order partitions and detach expired ones; --convert partitions the tables first.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--convert', action='store_true',
+            help='Turn the order tables into partitioned ones (locks them while the rows are copied)'
+        )
+        parser.add_argument('--months-ahead', type=int, help='Default: ORDER_PARTITION_MONTHS_AHEAD')
+        parser.add_argument('--retention-months', type=int, help='Default: ORDER_PARTITION_RETENTION_MONTHS')
+
+    def handle(self, *args, **options):
+        if not OrderPartitionService.available():
+            raise CommandError('Partitioning needs PostgreSQL')
+
+        if options['convert']:
+            for table in OrderPartitionService.convert(options['months_ahead']):
+                self.stdout.write(self.style.SUCCESS(f'Partitioned {table}'))
+
+        result = OrderPartitionService.maintain(options['months_ahead'], options['retention_months'])
+        for name in result['created']:
+            self.stdout.write(self.style.SUCCESS(f'Created {name}'))
+        for name in result['detached']:
+            self.stdout.write(self.style.SUCCESS(f'Detached {name}'))
@@ -0,0 +1,12 @@
+from django.db import models
+
+
+class OrderItemManager(models.Manager):
+
+    def bulk_create(self, objs, *args, **kwargs):
+        # bulk_create skips save(), the partition key is filled in here
+        objs = list(objs)
+        for item in objs:
+            if item.order_created_at is None:
+                item.order_created_at = item.order.created_at
+        return super().bulk_create(objs, *args, **kwargs)
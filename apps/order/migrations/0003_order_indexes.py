@@ -0,0 +1,36 @@
+# Generated by Django 4.2.9 on 2026-10-18 02:24
+
+from django.db import migrations, models
+from django.db.models.functions import Upper
+
+
+def uppercase_statuses(apps, schema_editor):
+    # Orders used to be created with status 'pending'; the status filter now
+    # matches exactly so that it can use order_status_created_idx.
+    Order = apps.get_model('order', 'Order')
+    Order.objects.exclude(status__in=['PENDING', 'PROCESSING', 'COMPLETED', 'CANCELLED']).update(
+        status=Upper('status')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(uppercase_statuses, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['customer', '-created_at', '-id'], name='order_customer_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['-created_at', '-id'], name='order_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['status', 'created_at'], name='order_status_created_idx'),
+        ),
+    ]
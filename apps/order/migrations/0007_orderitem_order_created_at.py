@@ -0,0 +1,33 @@
+# Generated by Django 4.2.9 on 2026-10-18 03:05
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def fill_order_created_at(apps, schema_editor):
+    Order = apps.get_model('order', 'Order')
+    OrderItem = apps.get_model('order', 'OrderItem')
+    OrderItem.objects.update(
+        order_created_at=Subquery(Order.objects.filter(pk=OuterRef('order_id')).values('created_at')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0006_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='order_created_at',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.RunPython(fill_order_created_at, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='order_created_at',
+            field=models.DateTimeField(editable=False),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.9 on 2026-10-18 03:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0008_idempotency_key_created_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='orderintent',
+            index=models.Index(condition=models.Q(('status', 'PROCESSING')), fields=['updated_at'], name='orderintent_processing_idx'),
+        ),
+    ]
@@ -1,6 +1,13 @@
-from django.db import models
+from decimal import Decimal
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, router, transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 
 from apps.base.models import BaseModel
+from .managers import OrderItemManager
 from apps.product.models import Product
 from apps.users.models import User
 
@@ -19,12 +26,71 @@ class Order(BaseModel):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # A customer's own order list, newest first
+            models.Index(
+                fields=['customer', '-created_at', '-id'], name='order_customer_created_idx',
+                condition=models.Q(deleted_at__isnull=True)
+            ),
+            # The admin order list, newest first
+            models.Index(
+                fields=['-created_at', '-id'], name='order_created_idx',
+                condition=models.Q(deleted_at__isnull=True)
+            ),
+            # Status filtering together with a date range
+            models.Index(
+                fields=['status', 'created_at'], name='order_status_created_idx',
+                condition=models.Q(deleted_at__isnull=True)
+            ),
+            # Rollup jobs reading what changed since their watermark
+            models.Index(fields=['updated_at'], name='order_updated_idx'),
+        ]
+
     def __str__(self):
         return f"Order #{self.id} - {self.customer.username}"
 
     def update_total_price(self):
-        self.total_price = sum(item.price * item.quantity for item in self.items.all())
-        self.save()
+        """Recompute the total from the stored items with a single UPDATE."""
+        line_totals = OrderItem.objects.filter(order=OuterRef('pk')).values('order').annotate(
+            total=Sum(ExpressionWrapper(F('price') * F('quantity'), output_field=self._meta.get_field('total_price')))
+        ).values('total')
+        Order.objects.filter(pk=self.pk).update(
+            total_price=Coalesce(Subquery(line_totals), Value(Decimal(0)), output_field=DecimalField()),
+            updated_at=timezone.now()
+        )
+        self.refresh_from_db(fields=['total_price', 'updated_at'])
+
+    def add_to_total(self, delta):
+        """
+        Move the stored total by ``delta`` with ``SET total_price = total_price + delta``
+        instead of re-reading every item. The in-memory value follows along.
+        """
+        if not delta:
+            return
+        now = timezone.now()
+        Order.objects.filter(pk=self.pk).update(total_price=F('total_price') + delta, updated_at=now)
+        self.total_price = Decimal(self.total_price or 0) + delta
+        self.updated_at = now
+
+    def add_items(self, items):
+        """Insert ``items`` with one query and move the total once for all of them."""
+        for item in items:
+            item.order = self
+            if item.price is None:
+                item.price = item.product.price
+        OrderItem.objects.bulk_create(items)
+        self.add_to_total(sum((item.line_total for item in items), Decimal(0)))
+        return items
+
+    def remove_items(self, items):
+        """Delete ``items`` (a queryset of this order's items) and move the total once."""
+        items = items.filter(order=self)
+        removed = items.aggregate(
+            total=Sum(ExpressionWrapper(F('price') * F('quantity'), output_field=self._meta.get_field('total_price')))
+        )['total']
+        items.delete()
+        self.add_to_total(-(removed or 0))
 
 
 class OrderItem(models.Model):
@@ -32,16 +98,107 @@ class OrderItem(models.Model):
     product = models.ForeignKey(Product, on_delete=models.PROTECT)
     quantity = models.PositiveIntegerField(default=1)
     price = models.DecimalField(max_digits=10, decimal_places=2)
+    # The order's created_at, which the items table is partitioned on when
+    # ORDER_PARTITIONING is used (see apps.order.partitions)
+    order_created_at = models.DateTimeField(editable=False)
+
+    objects = OrderItemManager()
 
     def __str__(self):
         return f"{self.quantity}x {self.product.name} for order #{self.order.id}"
 
+    @property
+    def line_total(self):
+        return Decimal(self.price) * self.quantity
+
+    def _lock_stored_total(self, using):
+        """
+        Lock this item's row and return price * quantity as stored, so the
+        order total moves by what the row really held rather than by what
+        this instance last saw. Zero when the row is gone.
+        """
+        stored = OrderItem.objects.using(using).select_for_update().filter(pk=self.pk).values_list(
+            'price', 'quantity'
+        ).first()
+        return Decimal(stored[0]) * stored[1] if stored else Decimal(0)
+
     def save(self, *args, **kwargs):
         if not self.pk:
             self.price = self.product.price
-        super().save(*args, **kwargs)
-        self.order.update_total_price()
+        if self.order_created_at is None:
+            self.order_created_at = self.order.created_at
+        if self._state.adding:
+            super().save(*args, **kwargs)
+            self.order.add_to_total(self.line_total)
+            return
+        using = kwargs.get('using') or router.db_for_write(OrderItem, instance=self)
+        with transaction.atomic(using=using):
+            previous = self._lock_stored_total(using)
+            super().save(*args, **kwargs)
+            self.order.add_to_total(self.line_total - previous)
 
     def delete(self, *args, **kwargs):
-        super().delete(*args, **kwargs)
-        self.order.update_total_price()
\ No newline at end of file
+        using = kwargs.get('using') or router.db_for_write(OrderItem, instance=self)
+        with transaction.atomic(using=using):
+            previous = self._lock_stored_total(using)
+            result = super().delete(*args, **kwargs)
+            self.order.add_to_total(-previous)
+        return result
+
+
+class OrderIntent(BaseModel):
+    """
+    An order accepted for asynchronous placement. The payload is only
+    checked for shape when it is accepted; workers turn queued intents into
+    orders in batches (see OrderIntentService).
+    """
+    INTENT_STATUS = (
+        ('QUEUED', 'Queued'),
+        ('PROCESSING', 'Processing'),
+        ('COMPLETED', 'Completed'),
+        ('FAILED', 'Failed'),
+    )
+
+    customer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='order_intents')
+    items = models.JSONField()
+    status = models.CharField(max_length=10, choices=INTENT_STATUS, default='QUEUED')
+    order = models.OneToOneField(Order, null=True, blank=True, on_delete=models.SET_NULL, related_name='intent')
+    errors = models.JSONField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Workers claim the oldest queued intents
+            models.Index(fields=['created_at'], name='orderintent_queued_idx', condition=models.Q(status='QUEUED')),
+            # Claims left behind by dead workers are found by age
+            models.Index(
+                fields=['updated_at'], name='orderintent_processing_idx', condition=models.Q(status='PROCESSING')
+            ),
+        ]
+
+    @property
+    def is_pending(self):
+        return self.status in ('QUEUED', 'PROCESSING')
+
+
+class IdempotencyKey(models.Model):
+    """
+    The response to a request sent with an ``Idempotency-Key`` header,
+    stored in the same transaction as the order it created so a retry can
+    be answered with it instead of placing the order again.
+    """
+    customer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField()
+    response = models.JSONField(encoder=DjangoJSONEncoder)
+    headers = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['customer', 'key'], name='idempotency_key_unique'),
+        ]
+        indexes = [
+            # Expired keys are purged by age
+            models.Index(fields=['created_at'], name='idempotency_key_created_idx'),
+        ]
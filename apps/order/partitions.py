@@ -0,0 +1,229 @@
+import logging
+import re
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Order, OrderItem
+
+logger = logging.getLogger(__name__)
+
+# Parent tables first: the items' foreign key needs the orders partitioned
+PARTITIONED = (
+    (Order, 'created_at'),
+    (OrderItem, 'order_created_at'),
+)
+
+PARTITION_NAME = re.compile(r'_p(\d{4})_(\d{2})$')
+
+
+def month_start(value):
+    return value.astimezone(dt_timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(month, count):
+    years, month_index = divmod(month.month - 1 + count, 12)
+    return month.replace(year=month.year + years, month=month_index + 1)
+
+
+class OrderPartitionService:
+    """
+    Optional monthly range partitioning of the order tables on Postgres.
+
+    ``order_order`` is partitioned on ``created_at`` and ``order_orderitem``
+    on ``order_created_at``, the order's creation time copied onto each
+    item, so an order and its items always land in the same month. Date
+    filtered order queries (``OrderFilter.date_range``) only touch the
+    months they cover, and old months can be detached whole instead of
+    deleted row by row.
+
+    Postgres wants the partition key in every unique constraint, so the
+    primary keys become ``(id, created_at)``: ids still come from one
+    sequence and stay unique. Items reference their order through
+    ``(order_id, order_created_at)``. ``order_orderintent.order_id`` is
+    left without a database level foreign key.
+
+    ``convert()`` turns the existing tables into partitioned ones once,
+    holding an exclusive lock while the rows are copied, so run it in a
+    maintenance window. ``maintain()`` keeps ORDER_PARTITION_MONTHS_AHEAD
+    months of partitions ready and, with ORDER_PARTITION_RETENTION_MONTHS
+    set, detaches older ones. Detached partitions stay behind as plain
+    tables to be archived or dropped.
+    """
+
+    @staticmethod
+    def available():
+        return connection.vendor == 'postgresql'
+
+    @classmethod
+    def enabled(cls):
+        return settings.ORDER_PARTITIONING and cls.available()
+
+    @staticmethod
+    def partition_name(model, month):
+        return f'{model._meta.db_table}_p{month:%Y_%m}'
+
+    @staticmethod
+    def is_partitioned(model):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass', [model._meta.db_table]
+            )
+            return cursor.fetchone() is not None
+
+    @staticmethod
+    def partitions(model):
+        """``{month: table}`` of the monthly partitions attached to ``model``'s table."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT child.relname FROM pg_inherits '
+                'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+                'WHERE pg_inherits.inhparent = %s::regclass',
+                [model._meta.db_table]
+            )
+            names = [name for name, in cursor.fetchall()]
+        months = {}
+        for name in names:
+            match = PARTITION_NAME.search(name)
+            if match:
+                months[datetime(int(match[1]), int(match[2]), 1, tzinfo=dt_timezone.utc)] = name
+        return months
+
+    @classmethod
+    def convert(cls, months_ahead=None):
+        """Partition the order tables that are not yet partitioned. Returns the converted tables."""
+        months_ahead = settings.ORDER_PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+        converted = []
+        with transaction.atomic(), connection.schema_editor(atomic=False) as editor:
+            for model, key in PARTITIONED:
+                if not cls.is_partitioned(model):
+                    cls._convert(editor, model, key, months_ahead)
+                    converted.append(model._meta.db_table)
+        return converted
+
+    @classmethod
+    def maintain(cls, months_ahead=None, retention_months=None):
+        """
+        Create the partitions for this month and the next ``months_ahead``
+        and detach the ones older than ``retention_months`` (kept when None).
+        Returns ``{'created': [...], 'detached': [...]}``.
+        """
+        months_ahead = settings.ORDER_PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+        if retention_months is None:
+            retention_months = settings.ORDER_PARTITION_RETENTION_MONTHS
+        result = {'created': [], 'detached': []}
+        current = month_start(timezone.now())
+
+        with transaction.atomic(), connection.schema_editor(atomic=False) as editor:
+            for model, _ in PARTITIONED:
+                if not cls.is_partitioned(model):
+                    continue
+                existing = cls.partitions(model)
+                for offset in range(months_ahead + 1):
+                    month = add_months(current, offset)
+                    if month not in existing:
+                        cls._create_partition(editor, model, month)
+                        result['created'].append(cls.partition_name(model, month))
+
+            if retention_months is not None:
+                oldest = add_months(current, -retention_months)
+                # Items first, the orders they reference cannot go before them
+                for model, _ in reversed(PARTITIONED):
+                    for month, name in sorted(cls.partitions(model).items()):
+                        if month < oldest:
+                            editor.execute('ALTER TABLE {} DETACH PARTITION {}'.format(
+                                editor.quote_name(model._meta.db_table), editor.quote_name(name)
+                            ))
+                            # A detached table keeps its copy of the foreign
+                            # keys, which would pin the orders' partition
+                            cls._drop_foreign_keys(editor, Order._meta.db_table, referencing=name)
+                            result['detached'].append(name)
+        return result
+
+    @classmethod
+    def _create_partition(cls, editor, model, month):
+        editor.execute("CREATE TABLE {} PARTITION OF {} FOR VALUES FROM ('{}') TO ('{}')".format(
+            editor.quote_name(cls.partition_name(model, month)),
+            editor.quote_name(model._meta.db_table),
+            month.isoformat(),
+            add_months(month, 1).isoformat(),
+        ))
+
+    @staticmethod
+    def _drop_foreign_keys(editor, referenced, referencing=None):
+        """Drop the foreign keys into ``referenced``, only those of ``referencing`` when given."""
+        sql = (
+            "SELECT conrelid::regclass::text, conname FROM pg_constraint "
+            "WHERE contype = 'f' AND conparentid = 0 AND confrelid = %s::regclass"
+        )
+        params = [referenced]
+        if referencing is not None:
+            sql += ' AND conrelid = %s::regclass'
+            params.append(referencing)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            constraints = cursor.fetchall()
+        for table, name in constraints:
+            editor.execute(f'ALTER TABLE {table} DROP CONSTRAINT {editor.quote_name(name)}')
+
+    @classmethod
+    def _convert(cls, editor, model, key, months_ahead):
+        table = model._meta.db_table
+        old = f'{table}_unpartitioned'
+        sequence = f'{table}_pk_seq'
+        quote = editor.quote_name
+
+        editor.execute(f'LOCK TABLE {quote(table)} IN ACCESS EXCLUSIVE MODE')
+        # Foreign keys into the table go, the partitioned one has no unique id to point at
+        cls._drop_foreign_keys(editor, table)
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT min({quote(key)}), max(id) FROM {quote(table)}')
+            first, last_id = cursor.fetchone()
+
+        editor.execute(f'ALTER TABLE {quote(table)} RENAME TO {quote(old)}')
+        editor.execute(
+            f'CREATE TABLE {quote(table)} (LIKE {quote(old)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+            f'PARTITION BY RANGE ({quote(key)})'
+        )
+        editor.execute(f'CREATE SEQUENCE {quote(sequence)} OWNED BY {quote(table)}.id START {(last_id or 0) + 1}')
+        editor.execute(f"ALTER TABLE {quote(table)} ALTER COLUMN id SET DEFAULT nextval('{sequence}')")
+
+        current = month_start(timezone.now())
+        month = month_start(first) if first is not None else current
+        while month <= add_months(current, months_ahead):
+            cls._create_partition(editor, model, month)
+            month = add_months(month, 1)
+        # Anything outside the prepared months, e.g. a far future timestamp
+        editor.execute(f'CREATE TABLE {quote(table + "_default")} PARTITION OF {quote(table)} DEFAULT')
+
+        editor.execute(f'INSERT INTO {quote(table)} SELECT * FROM {quote(old)}')
+        editor.execute(f'DROP TABLE {quote(old)}')
+        # Only now, the old table's index still held the primary key's name
+        editor.execute(f'ALTER TABLE {quote(table)} ADD PRIMARY KEY (id, {quote(key)})')
+
+        # Indexes and outgoing foreign keys as the model declares them,
+        # created on the parent and so on every partition
+        for field in model._meta.local_fields:
+            if field.primary_key:
+                continue
+            if field.db_index:
+                editor.execute(
+                    f'CREATE INDEX {quote(f"{table}_{field.column}_idx")} ON {quote(table)} ({quote(field.column)})'
+                )
+            if field.remote_field and field.db_constraint:
+                if field.related_model is Order:
+                    # Orders are unique on (id, created_at) now
+                    columns, targets = (field.column, key), ('id', 'created_at')
+                else:
+                    columns, targets = (field.column,), (field.target_field.column,)
+                editor.execute(
+                    f'ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(f"{table}_{field.column}_fk")} '
+                    f'FOREIGN KEY ({", ".join(map(quote, columns))}) '
+                    f'REFERENCES {quote(field.related_model._meta.db_table)} ({", ".join(map(quote, targets))}) '
+                    f'DEFERRABLE INITIALLY DEFERRED'
+                )
+        for index in model._meta.indexes:
+            editor.add_index(model, index)
+        logger.info('Partitioned %s on %s', table, key)
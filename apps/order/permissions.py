@@ -2,4 +2,4 @@ from rest_framework.permissions import BasePermission
 
 class IsOrderOwnerOrAdmin(BasePermission):
     def has_object_permission(self, request, view, obj):
-        return obj.customer == request.user or request.user.is_staff
\ No newline at end of file
+        return obj.customer_id == request.user.pk or request.user.is_staff
\ No newline at end of file
@@ -0,0 +1,186 @@
+import csv
+import io
+import random
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection, connections, models, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import Order, OrderItem
+from ..product.models import Product
+from ..users.models import User
+
+WORDS = (
+    'red', 'blue', 'green', 'black', 'steel', 'wooden', 'compact', 'deluxe', 'smart', 'classic',
+    'lamp', 'chair', 'table', 'kettle', 'phone', 'desk', 'bottle', 'jacket', 'sofa', 'speaker',
+)
+STATUSES = (('COMPLETED', 70), ('PENDING', 12), ('PROCESSING', 10), ('CANCELLED', 8))
+SEED_PASSWORD = 'seed-password'
+
+
+def _adapter(field):
+    """How the backend wants values of ``field`` passed, None when as they are."""
+    ops = connections[connection.alias].ops
+    if isinstance(field, models.DateTimeField):
+        return ops.adapt_datetimefield_value
+    if isinstance(field, models.DecimalField):
+        return lambda value: ops.adapt_decimalfield_value(value, field.max_digits, field.decimal_places)
+    return None
+
+
+def zipf_cum_weights(count, exponent):
+    """Cumulative weights giving rank n a share proportional to 1 / n ** exponent."""
+    return list(accumulate(1 / rank ** exponent for rank in range(1, count + 1)))
+
+
+class Seeder:
+    """
+    Generates users, products, orders and order items at production scale.
+
+    Rows are written ``batch_size`` at a time straight into the tables,
+    with ``COPY`` on Postgres and batched inserts elsewhere, so none of the
+    per row work of the models (password hashing, order total upkeep,
+    ``auto_now``) runs. Ids are handed out here, continuing after the
+    existing rows, and the sequences are moved past them at the end.
+
+    The data is skewed the way real traffic is: customers and products are
+    picked on Zipf curves so a few heavy customers and hot products carry
+    most orders, statuses follow ``STATUSES`` and orders spread over the
+    ``days`` before ``until``, denser towards the end. The same ``seed``
+    and ``until`` on an empty database give the same data.
+    """
+    customer_skew = 1.0
+    product_skew = 1.1
+
+    def __init__(self, seed=1, until=None, days=365, batch_size=10000, log=None):
+        self.rng = random.Random(seed)
+        until = until or timezone.now().date()
+        self.until = datetime.combine(until, time.min, tzinfo=dt_timezone.utc)
+        self.days = days
+        self.batch_size = batch_size
+        self.log = log or (lambda message: None)
+        self.now = timezone.now()
+
+    def run(self, users, products, orders, max_items=5):
+        """Returns ``{'users': (first_id, last_id), ...}`` for each table."""
+        created = {
+            'users': self.seed_users(users),
+            'products': self.seed_products(products),
+        }
+        created['orders'], created['items'] = self.seed_orders(orders, created['users'], created['products'], max_items)
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [User, Product, Order, OrderItem]):
+                cursor.execute(sql)
+        return created
+
+    def seed_users(self, count):
+        # One hash for everyone: hashing per user is what made seeding slow
+        password = make_password(SEED_PASSWORD)
+        first = self._next_id(User)
+
+        def rows(ids):
+            for pk in ids:
+                yield (pk, f'seed{pk}', f'seed{pk}@example.com', password, False, True, False,
+                       self.now, self.now)
+
+        self._write(User, ('id', 'username', 'email', 'password', 'is_superuser', 'is_active', 'is_admin',
+                           'created_at', 'updated_at'), first, count, rows)
+        return first, first + count - 1
+
+    def seed_products(self, count):
+        rng = self.rng
+        first = self._next_id(Product)
+
+        def rows(ids):
+            for pk in ids:
+                # Mostly cheap products with a long tail of expensive ones
+                price = Decimal(min(round(rng.lognormvariate(3.2, 1.0) * 100), 99999999)) / 100
+                yield (pk, f'{rng.choice(WORDS)} {rng.choice(WORDS)} {pk}', ' '.join(rng.sample(WORDS, 6)),
+                       max(price, Decimal('0.50')), rng.randint(0, 10000), self.now, self.now)
+
+        self._write(Product, ('id', 'name', 'description', 'price', 'quantity', 'created_at', 'updated_at'),
+                    first, count, rows)
+        return first, first + count - 1
+
+    def seed_orders(self, count, customer_ids, product_ids, max_items):
+        rng = self.rng
+        customers = self._shuffled(customer_ids)
+        products = self._shuffled(product_ids)
+        customer_weights = zipf_cum_weights(len(customers), self.customer_skew)
+        product_weights = zipf_cum_weights(len(products), self.product_skew)
+        prices = dict(Product.objects.filter(pk__range=product_ids).values_list('pk', 'price'))
+        statuses, status_weights = zip(*STATUSES)
+        line_counts = range(1, max_items + 1)
+        line_weights = [1 / n for n in line_counts]
+
+        first_order, first_item = self._next_id(Order), self._next_id(OrderItem)
+        next_item = first_item
+        for start in range(0, count, self.batch_size):
+            size = min(self.batch_size, count - start)
+            order_rows, item_rows = [], []
+            buyers = rng.choices(customers, cum_weights=customer_weights, k=size)
+            for pk, customer in zip(range(first_order + start, first_order + start + size), buyers):
+                # Skewed towards ``until``: a growing business
+                created_at = self.until - timedelta(seconds=self.days * 86400 * rng.random() ** 1.5)
+                total = Decimal(0)
+                lines = rng.choices(line_counts, line_weights)[0]
+                for product in dict.fromkeys(rng.choices(products, cum_weights=product_weights, k=lines)):
+                    quantity = rng.choices((1, 2, 3, 5), (70, 20, 7, 3))[0]
+                    total += prices[product] * quantity
+                    item_rows.append((next_item, pk, product, quantity, prices[product], created_at))
+                    next_item += 1
+                status = rng.choices(statuses, status_weights)[0]
+                order_rows.append((pk, customer, status, total, created_at, self.now))
+
+            with transaction.atomic():
+                self._insert(Order, ('id', 'customer_id', 'status', 'total_price', 'created_at', 'updated_at'),
+                             order_rows)
+                self._insert(OrderItem, ('id', 'order_id', 'product_id', 'quantity', 'price', 'order_created_at'),
+                             item_rows)
+            self.log(f'orders: {start + size}/{count}')
+        return (first_order, first_order + count - 1), (first_item, next_item - 1)
+
+    def _shuffled(self, id_range):
+        # Which ids end up hot is random too, not always the first ones
+        ids = list(range(id_range[0], id_range[1] + 1))
+        self.rng.shuffle(ids)
+        return ids
+
+    @staticmethod
+    def _next_id(model):
+        return (model._base_manager.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+    def _write(self, model, columns, first, count, rows):
+        for start in range(0, count, self.batch_size):
+            ids = range(first + start, first + min(start + self.batch_size, count))
+            with transaction.atomic():
+                self._insert(model, columns, list(rows(ids)))
+            self.log(f'{model._meta.verbose_name_plural}: {start + len(ids)}/{count}')
+
+    @staticmethod
+    def _insert(model, columns, rows):
+        if not rows:
+            return
+        quote = connection.ops.quote_name
+        table, names = quote(model._meta.db_table), ', '.join(quote(column) for column in columns)
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(rows)
+                sql = f'COPY {table} ({names}) FROM STDIN WITH (FORMAT csv)'
+                if hasattr(cursor.cursor, 'copy_expert'):  # psycopg2
+                    buffer.seek(0)
+                    cursor.cursor.copy_expert(sql, buffer)
+                else:
+                    with cursor.cursor.copy(sql) as copy:
+                        copy.write(buffer.getvalue())
+            else:
+                adapters = [_adapter(model._meta.get_field(column)) for column in columns]
+                rows = [[adapt(value) if adapt else value for adapt, value in zip(adapters, row)] for row in rows]
+                placeholders = ', '.join(['%s'] * len(columns))
+                cursor.executemany(f'INSERT INTO {table} ({names}) VALUES ({placeholders})', rows)
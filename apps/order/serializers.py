@@ -1,15 +1,19 @@
 # orders/serializers.py
+from collections import defaultdict
+
 from django.db import transaction
 from rest_framework.exceptions import ValidationError, PermissionDenied
 from rest_framework import serializers
-from .models import Order, OrderItem
+from .models import Order, OrderIntent, OrderItem
 from ..base.exceptions import NotEnoughStock
+from ..base.serializers import BaseModelSerializer
 from ..product.models import Product
 from ..product.serializers import ProductSerializer
+from ..product.services import ProductService, StockService
 from ..users.serializers import UserSerializer
 
 
-class OrderItemSerializer(serializers.ModelSerializer):
+class OrderItemSerializer(BaseModelSerializer):
     product = ProductSerializer(read_only=True)
     product_id = serializers.PrimaryKeyRelatedField(
         queryset=Product.objects.all(),
@@ -23,16 +27,42 @@ class OrderItemSerializer(serializers.ModelSerializer):
         read_only_fields = ['price']
 
 
+class OrderItemListSerializer(serializers.ListSerializer):
+    """
+    Resolves the products of every line with one query before the lines are
+    validated, so the cost does not grow with the size of the cart.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            ids = set()
+            for item in data:
+                try:
+                    ids.add(int(item['product_id']))
+                except (TypeError, ValueError, KeyError):
+                    # Left to the per-line field validation
+                    pass
+            products = ProductService.get_many(ids)
+            missing = sorted(ids - products.keys())
+            if missing:
+                raise ValidationError({
+                    'product_id': [
+                        "Invalid pk(s) {} - object does not exist.".format(', '.join(map(str, missing)))
+                    ]
+                })
+            self.child.products = products
+        return super().to_internal_value(data)
+
+
 class OrderItemCreateSerializer(serializers.ModelSerializer):
-    product_id = serializers.PrimaryKeyRelatedField(
-        queryset=Product.objects.all(),
-        source='product',
-        write_only=True
-    )
+    product_id = serializers.IntegerField(write_only=True)
+
+    products = None
 
     class Meta:
         model = OrderItem
         fields = ['product_id', 'quantity']
+        list_serializer_class = OrderItemListSerializer
 
     def validate(self, data):
         product = data['product']
@@ -43,14 +73,27 @@ class OrderItemCreateSerializer(serializers.ModelSerializer):
 
         if product.quantity < quantity:
             raise NotEnoughStock(
-                f"Not enough stock. Only {product.quantity} available"
+                f"Not enough stock. Only {product.quantity} available",
+                details={'items': [
+                    {'product_id': product.id, 'requested': quantity, 'available': product.quantity}
+                ]}
             )
 
         return data
 
+    def _get_product(self, product_id):
+        products = self.products
+        if products is None:
+            # Used on its own rather than through OrderItemListSerializer
+            products = ProductService.get_many([product_id])
+        try:
+            return products[product_id]
+        except KeyError:
+            raise ValidationError({'product_id': [f'Invalid pk "{product_id}" - object does not exist.']})
+
     def to_internal_value(self, data):
         data = super().to_internal_value(data)
-        product = data['product']
+        product = data['product'] = self._get_product(data.pop('product_id'))
         quantity = data['quantity']
 
         data['price'] = product.price
@@ -58,7 +101,7 @@ class OrderItemCreateSerializer(serializers.ModelSerializer):
         return data
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(BaseModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
     customer = UserSerializer(read_only=True)
     status = serializers.CharField(source='get_status_display')
@@ -89,30 +132,11 @@ class OrderCreateSerializer(serializers.ModelSerializer):
         user = self.context['request']
 
         with transaction.atomic():
-            # Validate all items first
-            products_to_update = []
-            order_items_to_create = []
-
-            for item_data in items_data:
-                product = item_data['product']
-                quantity = item_data['quantity']
-
-                if product.quantity < quantity:
-                    raise ValidationError(
-                        f"Not enough stock for product {product.id}. "
-                        f"Available: {product.quantity}, Requested: {quantity}"
-                    )
-
-                # Prepare product quantity update
-                product.quantity -= quantity
-                products_to_update.append(product)
-
-                # Prepare order item creation
-                order_items_to_create.append(OrderItem(
-                    product=product,
-                    quantity=quantity,
-                    price=item_data['price']
-                ))
+            # Take the stock first; the guarded updates fail the whole order
+            # if any line is short, before anything else is written
+            StockService.reserve(
+                (item_data['product'].id, item_data['quantity']) for item_data in items_data
+            )
 
             # Calculate total price
             total_price = sum(item['item_price'] for item in items_data)
@@ -120,17 +144,18 @@ class OrderCreateSerializer(serializers.ModelSerializer):
             # Create the order
             order = Order.objects.create(
                 customer=user,
-                total_price=total_price,
-                status='pending'
+                total_price=total_price
             )
 
-            # Bulk update product quantities
-            Product.objects.bulk_update(products_to_update, ['quantity'])
-
-            # Set order for all items and bulk create
-            for item in order_items_to_create:
-                item.order = order
-            OrderItem.objects.bulk_create(order_items_to_create)
+            OrderItem.objects.bulk_create([
+                OrderItem(
+                    order=order,
+                    product=item_data['product'],
+                    quantity=item_data['quantity'],
+                    price=item_data['price']
+                )
+                for item_data in items_data
+            ])
 
         return order
 
@@ -150,48 +175,29 @@ class OrderUpdateSerializer(serializers.ModelSerializer):
 
         with transaction.atomic():
             if items_data is not None:
-                # Prepare data for bulk operations
-                products_to_update = []
-                new_order_items = []
-
-                # First return quantities of old items
-                old_items = list(instance.items.select_related('product').all())
-                for old_item in old_items:
-                    product = old_item.product
-                    product.quantity += old_item.quantity
-                    products_to_update.append(product)
-
-                # Validate new items
+                # Net the old items against the new ones so each product row
+                # is touched once: returned stock and newly taken stock
+                deltas = defaultdict(int)
+                for product_id, quantity in instance.items.values_list('product_id', 'quantity'):
+                    deltas[product_id] -= quantity
                 for item_data in items_data:
-                    product = item_data['product']
-                    quantity = item_data['quantity']
-
-                    if product.quantity < quantity:
-                        raise ValidationError(
-                            f"Not enough stock for product {product.id}. "
-                            f"Available: {product.quantity}, Requested: {quantity}"
-                        )
-
-                    # Prepare product quantity update
-                    product.quantity -= quantity
-                    products_to_update.append(product)
-
-                    # Prepare new order item
-                    new_order_items.append(OrderItem(
-                        order=instance,
-                        product=product,
-                        quantity=quantity,
-                        price=item_data['price']
-                    ))
+                    deltas[item_data['product'].id] += item_data['quantity']
+                StockService.adjust(deltas)
 
                 # Calculate new total price
                 total_price = sum(item['item_price'] for item in items_data)
                 instance.total_price = total_price
 
-                # Perform bulk operations
-                Product.objects.bulk_update(products_to_update, ['quantity'])
                 instance.items.all().delete()
-                OrderItem.objects.bulk_create(new_order_items)
+                OrderItem.objects.bulk_create([
+                    OrderItem(
+                        order=instance,
+                        product=item_data['product'],
+                        quantity=item_data['quantity'],
+                        price=item_data['price']
+                    )
+                    for item_data in items_data
+                ])
 
             if 'status' in validated_data:
                 if not user.is_admin:
@@ -199,4 +205,21 @@ class OrderUpdateSerializer(serializers.ModelSerializer):
                 instance.status = validated_data['status']
 
         instance.save()
-        return instance
\ No newline at end of file
+        return instance
+
+
+class OrderIntentItemSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1)
+
+
+class OrderIntentCreateSerializer(serializers.Serializer):
+    """Shape-only validation for asynchronous checkout, it never hits the database."""
+    items = OrderIntentItemSerializer(many=True, allow_empty=False)
+
+
+class OrderIntentSerializer(BaseModelSerializer):
+    class Meta:
+        model = OrderIntent
+        fields = ['id', 'status', 'order', 'errors', 'created_at', 'updated_at']
+        read_only_fields = fields
@@ -1,10 +1,56 @@
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
 from django.db import transaction
-from rest_framework.exceptions import PermissionDenied
-from .models import Order, OrderItem
-from .serializers import OrderCreateSerializer, OrderUpdateSerializer
+from django.db.models import Prefetch
+from django.utils import timezone
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from .models import Order, OrderIntent, OrderItem
+from .serializers import OrderCreateSerializer, OrderIntentCreateSerializer, OrderUpdateSerializer
+from ..base import routers
+from ..base.exceptions import NotEnoughStock
+
+logger = logging.getLogger(__name__)
 
 
 class OrderService:
+    @classmethod
+    def get_queryset(cls, user, with_items=False, created=None):
+        """
+        Orders visible to ``user``: every order for admins, their own otherwise.
+        ``with_items`` loads customers, items and products up front so that
+        serializing any number of orders costs two queries.
+
+        ``created`` is the date range the orders will be filtered on, as a
+        slice of datetimes (see OrderFilter.created_range). The items
+        prefetch gets the same bound on their copy of the order's
+        created_at, so a partitioned items table is pruned the way the
+        orders are (see apps.order.partitions).
+        """
+        queryset = Order.objects.all()
+        if not user.is_admin:
+            queryset = queryset.filter(customer=user)
+        if with_items:
+            items = OrderItem.objects.select_related('product').filter(
+                **cls.date_range_lookups('order_created_at', created)
+            )
+            queryset = queryset.select_related('customer').prefetch_related(
+                Prefetch('items', queryset=items.order_by('pk'))
+            )
+        return queryset
+
+    @staticmethod
+    def date_range_lookups(field, created):
+        """Filter keyword arguments bounding ``field`` by the slice ``created``, either end may be open."""
+        lookups = {}
+        if created is not None and created.start is not None:
+            lookups[f'{field}__gte'] = created.start
+        if created is not None and created.stop is not None:
+            lookups[f'{field}__lte'] = created.stop
+        return lookups
+
     @classmethod
     def create_order(cls, user, products_data):
         """
@@ -29,4 +75,106 @@ class OrderService:
             context={'request': user}
         )
         serializer.is_valid(raise_exception=True)
-        return serializer.save()
\ No newline at end of file
+        return serializer.save()
+
+
+class OrderIntentService:
+    @classmethod
+    def submit(cls, user, data):
+        """
+        Accept an order for asynchronous placement. Only the shape of the
+        payload is checked here, products and stock are left to the worker.
+        """
+        serializer = OrderIntentCreateSerializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        intent = OrderIntent.objects.create(customer=user, items=serializer.validated_data['items'])
+
+        from .tasks import process_order_intents
+        transaction.on_commit(process_order_intents.delay)
+        return intent
+
+    @classmethod
+    def get_for_user(cls, user, intent_id):
+        queryset = OrderIntent.objects.all()
+        if not user.is_admin:
+            queryset = queryset.filter(customer=user)
+        return queryset.filter(pk=intent_id).first()
+
+    @classmethod
+    def process_batch(cls, batch_size=None):
+        """
+        Claim up to ``batch_size`` queued intents and place their orders.
+        ``SKIP LOCKED`` lets any number of workers drain the queue side by
+        side. Returns the number of intents handled.
+        """
+        batch_size = batch_size or settings.ORDER_INTENT_BATCH_SIZE
+        claimed_at = timezone.now()
+        with transaction.atomic():
+            intents = list(
+                OrderIntent.objects.select_for_update(skip_locked=True, of=('self',))
+                .select_related('customer')
+                .filter(status='QUEUED')
+                .order_by('created_at')[:batch_size]
+            )
+            # Stamped, so recover() can tell a claim whose worker died
+            OrderIntent.objects.filter(pk__in=[intent.pk for intent in intents]).update(
+                status='PROCESSING', updated_at=claimed_at
+            )
+
+        for intent in intents:
+            cls._process(intent, claimed_at)
+        return len(intents)
+
+    @classmethod
+    def _process(cls, intent, claimed_at):
+        # Settled under the intent's row lock, and only while this worker's
+        # claim stands: one that recover() handed on is left to its new
+        # claimant. The order commits together with its COMPLETED status.
+        with transaction.atomic():
+            claimed = OrderIntent.objects.select_for_update().filter(
+                pk=intent.pk, status='PROCESSING', updated_at=claimed_at
+            )
+            if not claimed.exists():
+                return
+            try:
+                with transaction.atomic():
+                    intent.order = OrderService.create_order(user=intent.customer, products_data=intent.items)
+                intent.status = 'COMPLETED'
+            except NotEnoughStock as e:
+                intent.order = None
+                intent.status, intent.errors = 'FAILED', {'error': e.message, **e.details}
+            except ValidationError as e:
+                intent.order = None
+                intent.status, intent.errors = 'FAILED', {'error': e.detail}
+            except Exception:
+                logger.exception('Placing order intent %s failed', intent.pk)
+                intent.order = None
+                intent.status, intent.errors = 'FAILED', {'error': 'Order creation failed'}
+            intent.save(update_fields=['order', 'status', 'errors', 'updated_at'])
+        # The customer polls for the outcome next, from the primary
+        routers.stick(intent.customer_id)
+
+    @classmethod
+    def recover(cls, timeout=None):
+        """
+        Put intents claimed more than ``timeout`` seconds ago back in the
+        queue, their worker died before settling them. Returns how many
+        intents are queued now, for the caller to drain.
+        """
+        timeout = settings.ORDER_INTENT_PROCESSING_TIMEOUT if timeout is None else timeout
+        stale = timezone.now() - timedelta(seconds=timeout)
+        requeued = OrderIntent.objects.filter(status='PROCESSING', updated_at__lt=stale).update(
+            status='QUEUED', updated_at=timezone.now()
+        )
+        if requeued:
+            logger.warning('Re-queued %s order intents left in processing', requeued)
+        return OrderIntent.objects.filter(status='QUEUED').count()
+
+    @classmethod
+    def wait(cls, intent, timeout, interval=0.1):
+        """Block until ``intent`` is settled or ``timeout`` seconds have passed."""
+        deadline = time.monotonic() + min(timeout, settings.ORDER_INTENT_MAX_WAIT)
+        while intent.is_pending and time.monotonic() < deadline:
+            time.sleep(interval)
+            intent.refresh_from_db(fields=['order', 'status', 'errors', 'updated_at'])
+        return intent
@@ -0,0 +1,43 @@
+from celery import shared_task
+from django.conf import settings
+
+from .idempotency import IdempotencyService
+from .partitions import OrderPartitionService
+from .services import OrderIntentService
+
+
+@shared_task
+def process_order_intents(batch_size=None):
+    """Place a batch of queued orders, and queue another run while some are left."""
+    batch_size = batch_size or settings.ORDER_INTENT_BATCH_SIZE
+    processed = OrderIntentService.process_batch(batch_size)
+    if processed == batch_size:
+        process_order_intents.delay(batch_size)
+    return processed
+
+
+@shared_task
+def recover_order_intents():
+    """
+    Scheduled by celery beat, see CELERY_BEAT_SCHEDULE. Re-queues intents
+    whose worker died and drains the queue, in case the run queued at
+    submission was lost.
+    """
+    queued = OrderIntentService.recover()
+    if queued:
+        process_order_intents.delay()
+    return queued
+
+
+@shared_task
+def maintain_order_partitions():
+    """Scheduled by celery beat, see CELERY_BEAT_SCHEDULE. Nothing to do unless ORDER_PARTITIONING is on."""
+    if not OrderPartitionService.enabled():
+        return None
+    return OrderPartitionService.maintain()
+
+
+@shared_task
+def purge_idempotency_keys():
+    """Scheduled by celery beat, see CELERY_BEAT_SCHEDULE."""
+    return IdempotencyService.purge_expired()
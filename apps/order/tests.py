@@ -1,8 +1,36 @@
-from django.test import TestCase
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
 from rest_framework import status
-from rest_framework.test import APITestCase
-from apps.order.models import Order, OrderItem
+from rest_framework.test import APIClient, APITestCase
+from apps.base.exceptions import NotEnoughStock
+from apps.base.serializers import CompiledSerializer
+from apps.base.throttling import LocalTokenBuckets, TokenBucketThrottle
+from apps.order.filters import OrderFilter
+from apps.order.imports import OrderImporter
+from apps.order.models import IdempotencyKey, Order, OrderIntent, OrderItem
+from apps.order.partitions import OrderPartitionService, add_months, month_start
+from apps.order.seed import SEED_PASSWORD, Seeder
+from apps.order.serializers import OrderCreateSerializer, OrderSerializer
+from apps.order.tasks import maintain_order_partitions, purge_idempotency_keys, recover_order_intents
+from apps.order.services import OrderIntentService, OrderService
+from apps.order.views import OrderViewSet
 from apps.product.models import Product
 from apps.users.models import User
 
@@ -55,6 +83,75 @@ class OrderModelTests(TestCase):
         self.assertEqual(order.status, 'PROCESSING')
 
 
+class OrderTotalTests(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(name='p', price=10, quantity=100)
+        self.customer = User.objects.create_user(
+            username='customer7',
+            email="user7@admin.com",
+            password='testpass',
+        )
+        self.order = Order.objects.create(customer=self.customer)
+
+    def _stored_total(self):
+        return Order.objects.get(pk=self.order.pk).total_price
+
+    def test_item_save_and_delete_move_the_total(self):
+        item = OrderItem.objects.create(order=self.order, product=self.product, quantity=3)
+        self.assertEqual(self._stored_total(), 30)
+
+        item = OrderItem.objects.get(pk=item.pk)
+        item.quantity = 5
+        item.save()
+        self.assertEqual(self._stored_total(), 50)
+
+        item.delete()
+        self.assertEqual(self._stored_total(), 0)
+
+    def test_batch_operations_update_the_total_once(self):
+        items = [OrderItem(product=self.product, quantity=i) for i in range(1, 11)]
+        with self.assertNumQueries(2):
+            self.order.add_items(items)
+        self.assertEqual(self._stored_total(), 550)
+
+        with self.assertNumQueries(3):
+            self.order.remove_items(self.order.items.filter(quantity__gt=5))
+        self.assertEqual(self._stored_total(), 150)
+
+        self.order.update_total_price()
+        self.assertEqual(self.order.total_price, 150)
+
+    def test_saves_after_another_write_move_the_total_by_the_stored_row(self):
+        item = OrderItem.objects.create(order=self.order, product=self.product, quantity=3)
+        first, second = OrderItem.objects.get(pk=item.pk), OrderItem.objects.get(pk=item.pk)
+
+        first.quantity = 5
+        first.save()
+        second.quantity = 7
+        second.save()
+        self.assertEqual(self._stored_total(), 70)
+
+        first.refresh_from_db()
+        first.quantity = 2
+        first.save()
+        self.assertEqual(self._stored_total(), 20)
+
+        second.delete()
+        self.assertEqual(self._stored_total(), 0)
+
+    def test_adding_an_item_never_reads_the_other_items(self):
+        """The work done per added item must not grow with the order size."""
+        for _ in range(50):
+            OrderItem.objects.create(order=self.order, product=self.product, quantity=1)
+
+        table = connection.ops.quote_name(OrderItem._meta.db_table)
+        with CaptureQueriesContext(connection) as ctx:
+            OrderItem.objects.create(order=self.order, product=self.product, quantity=1)
+        self.assertEqual(len(ctx.captured_queries), 2)
+        self.assertFalse([q['sql'] for q in ctx.captured_queries if f'FROM {table}' in q['sql']])
+        self.assertEqual(self._stored_total(), 510)
+
+
 class OrderViewSetTests(APITestCase):
     def setUp(self):
         # Create products
@@ -158,15 +255,15 @@ class OrderViewSetTests(APITestCase):
         self.client.force_authenticate(user=self.customer)
         response = self.client.get(self.list_url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]['customer']['username'], self.customer.username)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['customer']['username'], self.customer.username)
 
     def test_order_list_as_admin(self):
         """Admin should see all orders"""
         self.client.force_authenticate(user=self.admin)
         response = self.client.get(self.list_url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data['results']), 1)
 
     def test_order_list_unauthenticated(self):
         """Unauthenticated users should not see any orders"""
@@ -240,3 +337,895 @@ class OrderViewSetTests(APITestCase):
         data = {'status': 'INVALID_STATUS'}
         response = self.client.patch(self.detail_url, data, format='json')
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_order_create_reports_short_lines(self):
+        self.client.force_authenticate(user=self.customer)
+        data = {
+            'items': [
+                {'product_id': self.product1.id, 'quantity': 60},
+                {'product_id': self.product1.id, 'quantity': 60},
+                {'product_id': self.product2.id, 'quantity': 1}
+            ]
+        }
+        response = self.client.post(self.list_url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['errors']['items'], [
+            {'product_id': self.product1.id, 'requested': 120, 'available': 100}
+        ])
+        self.product2.refresh_from_db()
+        self.assertEqual(self.product2.quantity, 100)
+        self.assertEqual(Order.objects.count(), 1)
+
+
+class OrderQueryBudgetTests(APITestCase):
+    # ETag validator + count + orders (with their customers) + items (with their products)
+    list_queries = 4
+    detail_queries = 3
+
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            username='admin6',
+            email="admin6@admin.com",
+            password='testpass',
+            is_admin=True
+        )
+        self.customers = [
+            User.objects.create_user(username=f'customer6{i}', email=f'user6{i}@admin.com', password='testpass')
+            for i in range(3)
+        ]
+        self.products = [
+            Product.objects.create(name=f'product {i}', price=10, quantity=100)
+            for i in range(5)
+        ]
+
+    def _create_orders(self, count):
+        orders = []
+        for i in range(count):
+            order = Order.objects.create(customer=self.customers[i % len(self.customers)])
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=product, quantity=1, price=product.price)
+                for product in self.products
+            ])
+            orders.append(order)
+        return orders
+
+    def test_order_list_query_count_is_constant(self):
+        self.client.force_authenticate(user=self.admin)
+        self._create_orders(2)
+        with self.assertNumQueries(self.list_queries):
+            response = self.client.get('/api/orders/?limit=50')
+        self.assertEqual(len(response.data['results']), 2)
+
+        self._create_orders(20)
+        with self.assertNumQueries(self.list_queries):
+            response = self.client.get('/api/orders/?limit=50')
+        self.assertEqual(len(response.data['results']), 22)
+        self.assertEqual(len(response.data['results'][0]['items']), len(self.products))
+
+    def test_customer_order_list_query_count_is_constant(self):
+        self.client.force_authenticate(user=self.customers[0])
+        self._create_orders(12)
+        with self.assertNumQueries(self.list_queries):
+            response = self.client.get('/api/orders/')
+        self.assertEqual(len(response.data['results']), 4)
+
+    def test_order_detail_query_count_is_constant(self):
+        order = self._create_orders(1)[0]
+        self.client.force_authenticate(user=order.customer)
+        with self.assertNumQueries(self.detail_queries):
+            response = self.client.get(f'/api/orders/{order.id}/')
+        self.assertEqual(len(response.data['items']), len(self.products))
+
+
+class CompiledOrderSerializerTests(APITestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(username='compiled', email='compiled@admin.com', password='testpass')
+        self.products = [
+            Product.objects.create(name=f'compiled {i}', description='', price=Decimal('9.90') * (i + 1), quantity=10)
+            for i in range(3)
+        ]
+        self.order = Order.objects.create(customer=self.customer, status='SHIPPED')
+        self.order.add_items([
+            OrderItem(product=product, quantity=i + 1, price=product.price)
+            for i, product in enumerate(self.products)
+        ])
+        self.empty_order = Order.objects.create(customer=self.customer)
+
+    def test_output_matches_order_serializer(self):
+        orders = list(OrderService.get_queryset(self.customer, with_items=True))
+        compiled = CompiledSerializer.for_class(OrderSerializer)
+        self.assertEqual(compiled.many(orders), OrderSerializer(orders, many=True).data)
+        self.assertEqual(
+            json.dumps(compiled.to_representation(orders[0])),
+            json.dumps(OrderSerializer(orders[0]).data)
+        )
+
+    def test_api_returns_serializer_payload(self):
+        self.client.force_authenticate(user=self.customer)
+        order = OrderService.get_queryset(self.customer, with_items=True).get(pk=self.order.pk)
+        response = self.client.get(f'/api/orders/{self.order.pk}/')
+        self.assertEqual(response.json(), json.loads(json.dumps(OrderSerializer(order).data)))
+
+
+class OrderIdempotencyTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.customer = User.objects.create_user(username='retry', email='retry@admin.com', password='testpass')
+        self.product = Product.objects.create(name='retry product', price=10, quantity=5)
+        self.client.force_authenticate(user=self.customer)
+        self.payload = {'items': [{'product_id': self.product.id, 'quantity': 2}]}
+
+    def _post(self, key='key-1', payload=None, **extra):
+        return self.client.post(
+            '/api/orders/', payload or self.payload, format='json', HTTP_IDEMPOTENCY_KEY=key, **extra
+        )
+
+    def _touched_tables(self, context):
+        sql = ' '.join(query['sql'] for query in context.captured_queries)
+        return {table for table in ('order_order', 'order_orderitem', 'product_product') if f'"{table}"' in sql}
+
+    def test_retry_is_replayed_without_placing_another_order(self):
+        first = self._post()
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+
+        with CaptureQueriesContext(connection) as context:
+            retry = self._post()
+        self.assertEqual(self._touched_tables(context), set())
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json(), first.json())
+
+        self.assertEqual(Order.objects.count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 3)
+
+    def test_replay_falls_back_to_the_database(self):
+        first = self._post()
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            retry = self._post()
+        self.assertEqual(self._touched_tables(context), set())
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_keys_are_per_customer_and_per_request(self):
+        self._post()
+        other = self._post(payload={'items': [{'product_id': self.product.id, 'quantity': 1}]})
+        self.assertEqual(other.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+        self.client.force_authenticate(user=User.objects.create_user(
+            username='retry2', email='retry2@admin.com', password='testpass'
+        ))
+        self.assertEqual(self._post().status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_failed_request_can_be_retried(self):
+        self.assertEqual(
+            self._post(payload={'items': [{'product_id': self.product.id, 'quantity': 50}]}).status_code,
+            status.HTTP_400_BAD_REQUEST
+        )
+        Product.objects.filter(pk=self.product.pk).update(quantity=100)
+        response = self._post(payload={'items': [{'product_id': self.product.id, 'quantity': 50}]})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(response.has_header('Idempotent-Replayed'))
+
+    def test_async_submission_is_replayed_with_its_location(self):
+        first = self._post(HTTP_PREFER='respond-async')
+        retry = self._post(HTTP_PREFER='respond-async')
+        self.assertEqual(retry.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(retry['Location'], first['Location'])
+        self.assertEqual(OrderIntent.objects.count(), 1)
+
+    def test_requests_without_a_key_are_untouched(self):
+        self.client.post('/api/orders/', self.payload, format='json')
+        self.client.post('/api/orders/', self.payload, format='json')
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def _age_keys(self, seconds):
+        IdempotencyKey.objects.update(created_at=timezone.now() - timedelta(seconds=seconds))
+
+    def test_expired_key_runs_as_a_new_request(self):
+        self._post()
+        self._age_keys(settings.IDEMPOTENCY_KEY_TTL + 60)
+        cache.clear()
+        response = self._post()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(response.has_header('Idempotent-Replayed'))
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertEqual(IdempotencyKey.objects.count(), 1)
+
+    def test_purge_deletes_expired_keys_only(self):
+        one = {'items': [{'product_id': self.product.id, 'quantity': 1}]}
+        self._post('old-1', one)
+        self._post('old-2', one)
+        self._age_keys(settings.IDEMPOTENCY_KEY_TTL + 60)
+        self.assertEqual(self._post('fresh', one).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(purge_idempotency_keys.delay().get(), 2)
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['fresh'])
+
+
+class OrderIdempotencyConcurrencyTests(TransactionTestCase):
+    workers = 4
+
+    def setUp(self):
+        cache.clear()
+        self.customer = User.objects.create_user(username='racer', email='racer@admin.com', password='testpass')
+        self.product = Product.objects.create(name='race product', price=10, quantity=10)
+
+    def _post(self, _):
+        client = APIClient()
+        client.force_authenticate(user=self.customer)
+        try:
+            return client.post(
+                '/api/orders/', {'items': [{'product_id': self.product.id, 'quantity': 1}]},
+                format='json', HTTP_IDEMPOTENCY_KEY='same'
+            )
+        finally:
+            connection.close()
+
+    def test_concurrent_duplicates_wait_for_the_first(self):
+        create_order = OrderService.create_order.__func__
+
+        def slow_create_order(cls, **kwargs):
+            time.sleep(0.2)
+            return create_order(cls, **kwargs)
+
+        with patch.object(OrderService, 'create_order', classmethod(slow_create_order)):
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                responses = list(executor.map(self._post, range(self.workers)))
+
+        self.assertEqual({response.status_code for response in responses}, {status.HTTP_201_CREATED})
+        self.assertEqual(len({response.content for response in responses}), 1)
+        self.assertEqual(sum(response.has_header('Idempotent-Replayed') for response in responses), self.workers - 1)
+        self.assertEqual(Order.objects.count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 9)
+
+
+@override_settings(RATE_LIMIT_ENABLED=True, RATE_LIMITS={'orders': {'admin': '4/min', 'customer': '2/min'}})
+class OrderRateLimitTests(APITestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(username='noisy', email='noisy@admin.com', password='testpass')
+        self.admin = User.objects.create_user(username='noisyadmin', email='na@admin.com', password='x', is_admin=True)
+        self.product = Product.objects.create(name='limited', price=10, quantity=100)
+        self.payload = {'items': [{'product_id': self.product.id, 'quantity': 1}]}
+        patcher = patch.object(TokenBucketThrottle, '_buckets', LocalTokenBuckets())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _create(self, user):
+        self.client.force_authenticate(user=user)
+        return self.client.post('/api/orders/', self.payload, format='json').status_code
+
+    def test_writes_are_limited_per_user_and_tier(self):
+        self.assertEqual([self._create(self.customer) for _ in range(3)], [201, 201, 429])
+        self.assertEqual(self._create(self.admin), 201)
+        self.assertEqual(Order.objects.count(), 3)
+
+        self.client.force_authenticate(user=self.customer)
+        response = self.client.post('/api/orders/', self.payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '30')
+
+        # Reads are not limited
+        self.assertEqual(self.client.get('/api/orders/').status_code, status.HTTP_200_OK)
+
+    def test_admin_tier(self):
+        self.assertEqual([self._create(self.admin) for _ in range(5)], [201, 201, 201, 201, 429])
+
+    def test_unreachable_store_lets_requests_through(self):
+        with patch.object(LocalTokenBuckets, 'take', side_effect=ConnectionError):
+            self.assertEqual([self._create(self.customer) for _ in range(3)], [201, 201, 201])
+
+
+class OrderConditionalGetTests(APITestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(username='etag', email='etag@admin.com', password='testpass')
+        self.product = Product.objects.create(name='etag product', price=10, quantity=100)
+        self.order = Order.objects.create(customer=self.customer)
+        self.order.add_items([OrderItem(product=self.product, quantity=1)])
+        self.client.force_authenticate(user=self.customer)
+        self.url = f'/api/orders/{self.order.pk}/'
+
+    def _touch(self, model, pk):
+        # auto_now has a resolution the test can outrun
+        model.objects.filter(pk=pk).update(updated_at=timezone.now() + timedelta(seconds=1))
+
+    def test_unchanged_order_is_not_modified(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('Last-Modified', response)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+
+    def test_nested_changes_change_the_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        self._touch(Product, self.product.pk)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+        etag = response['ETag']
+        OrderItem.objects.filter(order=self.order).delete()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+    def test_list_etag_follows_the_orders(self):
+        url = '/api/orders/'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertNotEqual(self.client.get(url + '?limit=1')['ETag'], etag)
+
+        Order.objects.create(customer=self.customer)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+    def test_list_is_not_stale_after_a_delete(self):
+        url = '/api/orders/'
+        Order.objects.create(customer=self.customer)
+        response = self.client.get(url)
+        self.assertNotIn('Last-Modified', response)
+
+        self.assertLess(self.client.delete(self.url).status_code, 300)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 60))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 1)
+
+    def test_etag_is_per_user(self):
+        admin = User.objects.create_user(username='etagadmin', email='etagadmin@admin.com', password='x', is_admin=True)
+        etag = self.client.get(self.url)['ETag']
+        self.client.force_authenticate(user=admin)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+    def test_unknown_order_is_still_not_found(self):
+        self.assertEqual(self.client.get('/api/orders/999999/').status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get('/api/orders/abc/').status_code, status.HTTP_404_NOT_FOUND)
+
+
+class OrderPaginationTests(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            username='admin8',
+            email="admin8@admin.com",
+            password='testpass',
+            is_admin=True
+        )
+        self.orders = [
+            Order.objects.create(customer=self.admin, total_price=price)
+            for price in (5, 3, 8, 1, 9, 2, 7, 4)
+        ]
+        # Half of the orders share a timestamp so the id tie breaker matters
+        Order.objects.filter(pk__in=[o.pk for o in self.orders[:4]]).update(created_at=self.orders[0].created_at)
+        self.client.force_authenticate(user=self.admin)
+
+    def _walk(self, url):
+        ids, pages = [], 0
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids += [order['id'] for order in response.data['results']]
+            url = response.data['next']
+            pages += 1
+        return ids, pages
+
+    def test_pages_follow_created_at_and_id(self):
+        expected = list(
+            Order.objects.order_by('-created_at', '-id').values_list('id', flat=True)
+        )
+        ids, pages = self._walk('/api/orders/?limit=3')
+        self.assertEqual(ids, expected)
+        self.assertEqual(pages, 3)
+
+    def test_ordering_fields_are_part_of_the_key(self):
+        ids, _ = self._walk('/api/orders/?limit=3&ordering=-total_price')
+        expected = list(Order.objects.order_by('-total_price', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_previous_link_returns_the_previous_page(self):
+        first = self.client.get('/api/orders/?limit=3')
+        self.assertIsNone(first.data['previous'])
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual(back.data['results'], first.data['results'])
+
+    def test_count_free_mode(self):
+        response = self.client.get('/api/orders/?limit=3')
+        self.assertEqual(response.data['count'], len(self.orders))
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/orders/?limit=3&count=false')
+        self.assertNotIn('count', response.data)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/orders/?cursor=bogus')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class OrderIndexPlanTests(TestCase):
+    """
+    The hot order queries must keep hitting their indexes. Postgres is told
+    to avoid sequential and bitmap scans: on the tiny, unanalyzed test
+    tables a scan of any index followed by a sort looks as cheap.
+    """
+
+    def setUp(self):
+        self.customer = User.objects.create_user(
+            username='customer9',
+            email="user9@admin.com",
+            password='testpass',
+        )
+        self.product = Product.objects.create(name='p', price=10, quantity=10)
+
+    def assertUsesIndex(self, queryset, index_name):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute('SET LOCAL enable_bitmapscan = off')
+        plan = queryset.explain()
+        self.assertIn(index_name, plan)
+
+    def test_customer_order_list(self):
+        queryset = OrderService.get_queryset(self.customer).order_by('-created_at', '-id')[:10]
+        self.assertUsesIndex(queryset, 'order_customer_created_idx')
+
+    def test_admin_order_list(self):
+        queryset = Order.objects.order_by('-created_at', '-id')[:10]
+        self.assertUsesIndex(queryset, 'order_created_idx')
+
+    def test_status_filter(self):
+        queryset = OrderFilter(
+            {'status': 'pending', 'date_range_after': '2024-01-01'}, queryset=Order.objects.all()
+        ).qs
+        self.assertUsesIndex(queryset, 'order_status_created_idx')
+
+    def test_order_items_by_product(self):
+        queryset = OrderItem.objects.filter(product=self.product)
+        self.assertUsesIndex(queryset, 'product_id')
+
+    def test_product_list(self):
+        queryset = Product.objects.order_by('id')[:10]
+        self.assertUsesIndex(queryset, 'product_live_idx')
+
+
+class OrderPartitionKeyTests(APITestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(username='customer20', email='user20@admin.com', password='testpass')
+        self.product = Product.objects.create(name='p', price=10, quantity=10)
+        self.order = Order.objects.create(customer=self.customer)
+
+    def test_items_copy_the_order_creation_time(self):
+        saved = OrderItem.objects.create(order=self.order, product=self.product, quantity=1)
+        added, = self.order.add_items([OrderItem(product=self.product, quantity=2)])
+        for item in (saved, added):
+            item.refresh_from_db()
+            self.assertEqual(item.order_created_at, self.order.created_at)
+
+    def test_date_range_bounds_the_items_prefetch(self):
+        OrderItem.objects.create(order=self.order, product=self.product, quantity=1)
+        self.client.force_authenticate(user=self.customer)
+        today = timezone.localdate().isoformat()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/orders/', {'date_range_after': '2024-01-01', 'date_range_before': today})
+        self.assertEqual(len(response.data['results'][0]['items']), 1)
+        items_sql = next(query['sql'] for query in context.captured_queries if 'FROM "order_orderitem"' in query['sql'])
+        where = items_sql.split(' WHERE ', 1)[1]
+        self.assertIn('"order_orderitem"."order_created_at" >=', where)
+        self.assertIn('"order_orderitem"."order_created_at" <=', where)
+
+    def test_month_arithmetic(self):
+        month = month_start(timezone.now().replace(year=2024, month=11, day=17))
+        self.assertEqual((month.day, month.hour), (1, 0))
+        self.assertEqual(add_months(month, 2).date().isoformat(), '2025-01-01')
+        self.assertEqual(add_months(month, -11).date().isoformat(), '2023-12-01')
+        self.assertEqual(OrderPartitionService.partition_name(Order, month), 'order_order_p2024_11')
+
+    def test_maintenance_is_a_no_op_without_partitioning(self):
+        self.assertIsNone(maintain_order_partitions())
+
+
+@skipUnless(connection.vendor == 'postgresql', 'partitioning needs Postgres, set TEST_DATABASE_URL')
+class OrderPartitionConversionTests(TestCase):
+    """
+    Converts the order tables for real. Postgres DDL is transactional, so
+    the test's rollback leaves the plain tables to the other tests.
+    """
+
+    def setUp(self):
+        self.customer = User.objects.create_user(username='customer21', email='user21@admin.com', password='testpass')
+        self.product = Product.objects.create(name='p', price=10, quantity=100)
+        self.now = timezone.now()
+        self.old = self._order(add_months(month_start(self.now), -3) + timedelta(days=2))
+        self.recent = self._order(self.now)
+        self._check_constraints()
+
+    def _order(self, created_at):
+        order = Order.objects.create(customer=self.customer)
+        Order.objects.filter(pk=order.pk).update(created_at=created_at)
+        order.refresh_from_db()
+        order.add_items([OrderItem(product=self.product, quantity=1)])
+        return order
+
+    @staticmethod
+    def _check_constraints():
+        # Pending deferred foreign key checks would block ALTER TABLE in
+        # this one transaction, in production each step runs in its own
+        with connection.cursor() as cursor:
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+    @staticmethod
+    def _count(table):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM {connection.ops.quote_name(table)}')
+            return cursor.fetchone()[0]
+
+    def test_convert_and_maintain(self):
+        self.assertEqual(OrderPartitionService.convert(months_ahead=2), ['order_order', 'order_orderitem'])
+        current = month_start(self.now)
+        old_month = month_start(self.old.created_at)
+        for model in (Order, OrderItem):
+            self.assertTrue(OrderPartitionService.is_partitioned(model))
+            self.assertEqual(
+                sorted(OrderPartitionService.partitions(model)),
+                [add_months(old_month, offset) for offset in range(6)]
+            )
+        self.assertEqual(self._count(OrderPartitionService.partition_name(OrderItem, old_month)), 1)
+        self.assertEqual(self._count(OrderPartitionService.partition_name(Order, current)), 1)
+        self.assertEqual(OrderPartitionService.convert(), [])
+
+        # The declared indexes and the foreign keys are back
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT indexname FROM pg_indexes WHERE tablename IN ('order_order', 'order_orderitem')")
+            indexes = {name for name, in cursor.fetchall()}
+        self.assertTrue({
+            'order_customer_created_idx', 'order_created_idx', 'order_order_customer_id_idx',
+            'order_orderitem_order_id_idx', 'order_orderitem_product_id_idx',
+        } <= indexes)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            OrderItem.objects.bulk_create([OrderItem(
+                order=self.recent, product=self.product, price=1, order_created_at=self.old.created_at
+            )])
+            self._check_constraints()
+
+        # The ORM works as before, ids carry on from the old sequence
+        order = Order.objects.create(customer=self.customer)
+        self.assertGreater(order.pk, self.recent.pk)
+        order.add_items([OrderItem(product=self.product, quantity=2)])
+        order.refresh_from_db()
+        self.assertEqual(order.total_price, 20)
+        in_range = OrderFilter({'date_range_after': current.date().isoformat()}, queryset=Order.objects.all()).qs
+        self.assertEqual(sorted(in_range.values_list('pk', flat=True)), [self.recent.pk, order.pk])
+
+        self._check_constraints()
+        result = OrderPartitionService.maintain(months_ahead=3, retention_months=1)
+        self.assertEqual(result['created'], [
+            OrderPartitionService.partition_name(model, add_months(current, 3)) for model in (Order, OrderItem)
+        ])
+        self.assertEqual(result['detached'], [
+            OrderPartitionService.partition_name(model, add_months(old_month, offset))
+            for model in (OrderItem, Order) for offset in range(2)
+        ])
+
+
+class SeedTests(TestCase):
+    until = timezone.now().date() - timedelta(days=3)
+
+    def _orders(self, created):
+        first_user, first_product = created['users'][0], created['products'][0]
+        orders = Order.objects.filter(pk__range=created['orders']).order_by('pk')
+        return [
+            (order.customer_id - first_user, order.status, order.total_price, order.created_at,
+             [(item.product_id - first_product, item.quantity) for item in order.items.order_by('pk')])
+            for order in orders.prefetch_related('items')
+        ]
+
+    def test_seeded_rows_are_consistent(self):
+        call_command('seed', users=20, products=30, orders=200, seed=7, stdout=StringIO())
+
+        self.assertEqual(User.objects.count(), 20)
+        self.assertEqual(Product.objects.count(), 30)
+        self.assertEqual(Order.objects.count(), 200)
+        self.assertTrue(User.objects.first().check_password(SEED_PASSWORD))
+        for order in Order.objects.prefetch_related('items'):
+            items = order.items.all()
+            self.assertTrue(1 <= len(items) <= 5)
+            self.assertEqual(order.total_price, sum(item.line_total for item in items))
+            self.assertEqual({item.order_created_at for item in items}, {order.created_at})
+
+        # The sequences were moved past the seeded ids
+        Order.objects.create(customer=User.objects.first())
+
+    def test_same_seed_same_data(self):
+        first = self._orders(Seeder(seed=3, until=self.until).run(users=10, products=15, orders=50))
+        second = self._orders(Seeder(seed=3, until=self.until).run(users=10, products=15, orders=50))
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, self._orders(Seeder(seed=4, until=self.until).run(users=10, products=15, orders=50)))
+
+
+class OrderAsyncCheckoutTests(APITestCase):
+    def setUp(self):
+        self.product = Product.objects.create(name='p', price=10, quantity=5)
+        self.customer = User.objects.create_user(
+            username='customer10',
+            email="user10@admin.com",
+            password='testpass',
+        )
+        self.other_customer = User.objects.create_user(
+            username='customer11',
+            email="user11@admin.com",
+            password='testpass',
+        )
+        self.client.force_authenticate(user=self.customer)
+
+    def _submit(self, items, execute=True):
+        with self.captureOnCommitCallbacks(execute=execute):
+            return self.client.post(
+                '/api/orders/', {'items': items}, format='json', HTTP_PREFER='respond-async'
+            )
+
+    def test_async_order_is_accepted_and_placed_by_the_worker(self):
+        response = self._submit([{'product_id': self.product.id, 'quantity': 2}])
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['data']['status'], 'QUEUED')
+
+        response = self.client.get(response.data['data']['status_url'])
+        self.assertEqual(response.data['data']['status'], 'COMPLETED')
+        order = Order.objects.get(pk=response.data['data']['order'])
+        self.assertEqual(order.customer, self.customer)
+        self.assertEqual(order.total_price, 20)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 3)
+
+    def test_failed_intent_reports_errors(self):
+        response = self._submit([{'product_id': self.product.id, 'quantity': 6}])
+        intent = OrderIntent.objects.get(pk=response.data['data']['intent_id'])
+        self.assertEqual(intent.status, 'FAILED')
+        self.assertEqual(intent.errors['items'][0]['available'], 5)
+        self.assertIsNone(intent.order)
+
+    def test_intents_are_processed_in_batches(self):
+        for _ in range(3):
+            self._submit([{'product_id': self.product.id, 'quantity': 1}], execute=False)
+        self.assertEqual(OrderIntentService.process_batch(batch_size=2), 2)
+        self.assertEqual(OrderIntentService.process_batch(batch_size=2), 1)
+        self.assertEqual(OrderIntent.objects.filter(status='COMPLETED').count(), 3)
+
+    def test_shape_is_validated_before_queueing(self):
+        response = self._submit([{'product_id': self.product.id, 'quantity': 0}])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(OrderIntent.objects.exists())
+
+    def test_wait_returns_once_settled_and_intents_are_private(self):
+        response = self._submit([{'product_id': self.product.id, 'quantity': 1}])
+        url = response.data['data']['status_url']
+        self.assertEqual(self.client.get(url, {'wait': 5}).data['data']['status'], 'COMPLETED')
+
+        self.client.force_authenticate(user=self.other_customer)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def _intent(self, **fields):
+        return OrderIntent.objects.create(
+            customer=self.customer, items=[{'product_id': self.product.id, 'quantity': 1}], **fields
+        )
+
+    def _abandoned_intent(self, seconds_ago):
+        intent = self._intent(status='PROCESSING')
+        OrderIntent.objects.filter(pk=intent.pk).update(updated_at=timezone.now() - timedelta(seconds=seconds_ago))
+        return intent
+
+    def test_intents_left_processing_are_recovered(self):
+        stale = self._abandoned_intent(settings.ORDER_INTENT_PROCESSING_TIMEOUT + 60)
+        busy = self._abandoned_intent(1)
+        queued = self._intent()
+
+        self.assertEqual(recover_order_intents.delay().get(), 2)
+        stale.refresh_from_db()
+        queued.refresh_from_db()
+        busy.refresh_from_db()
+        self.assertEqual((stale.status, queued.status, busy.status), ('COMPLETED', 'COMPLETED', 'PROCESSING'))
+
+    def test_a_claim_handed_on_is_not_placed_twice(self):
+        intent = self._abandoned_intent(settings.ORDER_INTENT_PROCESSING_TIMEOUT + 60)
+        claimed_at = OrderIntent.objects.get(pk=intent.pk).updated_at
+        OrderIntentService.recover()
+        OrderIntentService.process_batch()
+        # The first worker wakes up after its claim was re-queued and placed
+        OrderIntentService._process(OrderIntent.objects.get(pk=intent.pk), claimed_at)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_unexpected_errors_are_logged(self):
+        self._submit([{'product_id': self.product.id, 'quantity': 1}], execute=False)
+        with patch.object(OrderService, 'create_order', side_effect=RuntimeError('boom')), \
+                self.assertLogs('apps.order.services', 'ERROR') as logs:
+            OrderIntentService.process_batch()
+        self.assertIn('boom', '\n'.join(logs.output))
+        self.assertEqual(OrderIntent.objects.get().errors, {'error': 'Order creation failed'})
+
+
+class OrderImportTests(APITestCase):
+    def setUp(self):
+        self.product1 = Product.objects.create(name='p1', price=10, quantity=5)
+        self.product2 = Product.objects.create(name='p2', price=3, quantity=100)
+        self.customer = User.objects.create_user(
+            username='customer12',
+            email="user12@admin.com",
+            password='testpass',
+        )
+        self.admin = User.objects.create_user(
+            username='admin12',
+            email="admin12@admin.com",
+            password='testpass',
+            is_admin=True
+        )
+
+    def _jsonl(self, *records):
+        return [json.dumps(record) + '\n' for record in records]
+
+    def test_jsonl_import_with_rejects(self):
+        rejects = []
+        lines = self._jsonl(
+            {'customer_id': self.customer.id, 'status': 'completed', 'created_at': '2024-01-02T10:00:00Z',
+             'items': [{'product_id': self.product1.id, 'quantity': 2}, {'product_id': self.product2.id, 'quantity': 1}]},
+            {'customer_id': self.customer.id, 'items': [{'product_id': self.product1.id, 'quantity': 4}]},
+            {'customer_id': 999999, 'items': [{'product_id': self.product2.id, 'quantity': 1}]},
+            {'customer_id': self.customer.id, 'items': []},
+        ) + ['not json\n']
+        importer = OrderImporter(chunk_size=2, reject=lambda line, error, record: rejects.append((line, error)))
+        result = importer.run(lines, 'jsonl')
+
+        self.assertEqual(result, {'orders': 1, 'items': 2, 'rejected': 4})
+        self.assertEqual(sorted(line for line, _ in rejects), [2, 3, 4, 5])
+        order = Order.objects.get()
+        self.assertEqual(order.status, 'COMPLETED')
+        self.assertEqual(order.total_price, 23)
+        self.assertEqual(order.created_at.year, 2024)
+        self.assertEqual(set(order.items.values_list('order_created_at', flat=True)), {order.created_at})
+        self.product1.refresh_from_db()
+        self.assertEqual(self.product1.quantity, 3)
+
+    def test_csv_rows_are_grouped_into_orders(self):
+        lines = [
+            'order_ref,customer_id,product_id,quantity,price\n',
+            f'a,{self.customer.id},{self.product1.id},1,9.50\n',
+            f'a,{self.customer.id},{self.product2.id},2,\n',
+            f'b,{self.customer.id},{self.product2.id},1,\n',
+        ]
+        result = OrderImporter(adjust_stock=False).run(lines, 'csv')
+        self.assertEqual(result, {'orders': 2, 'items': 3, 'rejected': 0})
+        self.assertEqual(sorted(Order.objects.values_list('total_price', flat=True)), [3, Decimal('15.50')])
+        self.product2.refresh_from_db()
+        self.assertEqual(self.product2.quantity, 100)
+
+    def test_import_endpoint_is_admin_only(self):
+        content = ''.join(self._jsonl(
+            {'customer_id': self.customer.id, 'items': [{'product_id': self.product2.id, 'quantity': 1}]}
+        )).encode()
+
+        self.client.force_authenticate(user=self.customer)
+        response = self.client.post('/api/orders/import/', {'file': SimpleUploadedFile('orders.jsonl', content)})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.post('/api/orders/import/', {'file': SimpleUploadedFile('orders.jsonl', content)})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['data']['orders'], 1)
+
+
+class OrderExportTests(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            username='admin13',
+            email="admin13@admin.com",
+            password='testpass',
+            is_admin=True
+        )
+        self.customer = User.objects.create_user(
+            username='customer13',
+            email="user13@admin.com",
+            password='testpass',
+        )
+        self.product = Product.objects.create(name='p', price=10, quantity=100)
+        for quantity in range(1, 6):
+            order = Order.objects.create(customer=self.customer, status='COMPLETED' if quantity % 2 else 'PENDING')
+            order.add_items([OrderItem(product=self.product, quantity=quantity), OrderItem(product=self.product)])
+        self.client.force_authenticate(user=self.admin)
+
+    def _content(self, response):
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return b''.join(response.streaming_content).decode()
+
+    def test_ndjson_export_applies_the_order_filters(self):
+        response = self.client.get('/api/orders/export/', {'status': 'completed', 'min_price': 35})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in self._content(response).splitlines()]
+        self.assertEqual([row['total_price'] for row in rows], ['40.00', '60.00'])
+        self.assertEqual(len(rows[0]['items']), 2)
+
+    def test_csv_export_has_a_row_per_item(self):
+        with patch.object(OrderViewSet, 'export_chunk_size', 2):
+            lines = self._content(self.client.get('/api/orders/export/', {'as': 'csv'})).splitlines()
+        self.assertEqual(lines[0].split(',')[:2], ['order_id', 'customer_id'])
+        self.assertEqual(len(lines), 1 + 10)
+
+    def test_export_without_server_side_cursors(self):
+        with patch.object(OrderViewSet, 'export_chunk_size', 2), \
+                patch.dict(connection.settings_dict, {'DISABLE_SERVER_SIDE_CURSORS': True}):
+            rows = [json.loads(line) for line in self._content(self.client.get('/api/orders/export/')).splitlines()]
+        self.assertEqual([row['total_price'] for row in rows], ['20.00', '30.00', '40.00', '50.00', '60.00'])
+
+    def test_export_is_admin_only(self):
+        self.client.force_authenticate(user=self.customer)
+        self.assertEqual(self.client.get('/api/orders/export/').status_code, status.HTTP_403_FORBIDDEN)
+
+
+class OrderItemResolutionTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(
+            username='customer5',
+            email="user5@admin.com",
+            password='testpass',
+        )
+        self.products = [
+            Product.objects.create(name=f'product {i}', price=10, quantity=10)
+            for i in range(20)
+        ]
+
+    def _serializer(self, items):
+        return OrderCreateSerializer(data={'items': items}, context={'request': self.customer})
+
+    def test_products_are_loaded_with_one_query(self):
+        serializer = self._serializer([{'product_id': p.id, 'quantity': 1} for p in self.products])
+        with self.assertNumQueries(1):
+            self.assertTrue(serializer.is_valid())
+        self.assertEqual(
+            [item['product'] for item in serializer.validated_data['items']],
+            self.products
+        )
+
+    def test_unknown_and_deleted_products_are_reported_together(self):
+        deleted = self.products[0]
+        deleted.soft_delete()
+        serializer = self._serializer([
+            {'product_id': deleted.id, 'quantity': 1},
+            {'product_id': self.products[1].id, 'quantity': 1},
+            {'product_id': 999999, 'quantity': 1},
+        ])
+        self.assertFalse(serializer.is_valid())
+        self.assertEqual(
+            serializer.errors['items']['product_id'],
+            [f'Invalid pk(s) {deleted.id}, 999999 - object does not exist.']
+        )
+
+
+class OrderStockConcurrencyTests(TransactionTestCase):
+    workers = 8
+    attempts = 40
+    stock = 25
+
+    def setUp(self):
+        self.product = Product.objects.create(name='hot', price=10, quantity=self.stock)
+        self.customers = [
+            User.objects.create_user(username=f'buyer{i}', email=f'buyer{i}@admin.com', password='testpass')
+            for i in range(self.workers)
+        ]
+
+    def _checkout(self, attempt):
+        try:
+            OrderService.create_order(
+                user=self.customers[attempt % self.workers],
+                products_data=[{'product_id': self.product.id, 'quantity': 1}]
+            )
+            return True
+        except NotEnoughStock:
+            return False
+        finally:
+            connection.close()
+
+    def test_hot_product_is_never_oversold(self):
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            results = list(executor.map(self._checkout, range(self.attempts)))
+
+        self.product.refresh_from_db()
+        self.assertEqual(results.count(True), self.stock)
+        self.assertEqual(self.product.quantity, 0)
+        self.assertEqual(OrderItem.objects.filter(product=self.product).count(), self.stock)
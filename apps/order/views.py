@@ -1,22 +1,40 @@
 # orders/views.py
+import io
+import os
+from datetime import date
+
+from django.http import StreamingHttpResponse
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema, OpenApiExample
 from rest_framework import viewsets, filters, status
+from rest_framework.decorators import action
 from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.reverse import reverse
 from django_filters.rest_framework import DjangoFilterBackend
 from .models import Order, OrderItem
-from .serializers import OrderSerializer, OrderItemSerializer, OrderCreateSerializer, OrderUpdateSerializer
+from .serializers import (
+    OrderSerializer, OrderItemSerializer, OrderCreateSerializer, OrderUpdateSerializer, OrderIntentSerializer
+)
 from .permissions import IsOrderOwnerOrAdmin
 from .filters import OrderFilter
-from .services import  OrderService
+from .idempotency import IdempotencyService
+from .exports import WRITERS
+from .imports import READERS, OrderImporter
+from .services import OrderService, OrderIntentService
+from ..analytics.services import OrderStatsService
+from ..base.db import iterate
 from ..base.exceptions import NotEnoughStock
+from ..base.pagination import KeysetPagination
+from ..base.permissions import IsAdminPermission
+from ..base.views import CompiledReadMixin, ConditionalGetMixin, ReplicaReadMixin
 from ..base.responses import Response
 from ..product.models import Product
 
 
 @extend_schema(tags=['Orders Endpoints'])
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(ReplicaReadMixin, ConditionalGetMixin, CompiledReadMixin, viewsets.ModelViewSet):
     """
     API endpoint for orders with filtering, searching, and ordering.
     Accessible by authenticated users, with admin seeing all orders.
@@ -32,13 +50,23 @@ class OrderViewSet(viewsets.ModelViewSet):
     filterset_class = OrderFilter  # Your custom filter class
     search_fields = ['status', 'customer__username']
     ordering_fields = ['created_at', 'total_price']
+    ordering = ['-created_at', '-id']
+    pagination_class = KeysetPagination
+    throttle_scope = 'orders'
+    # Everything OrderSerializer nests, for the ETag. Item changes move the
+    # order's total and with it updated_at, additions and removals the count
+    last_modified_fields = ('updated_at', 'customer__updated_at', 'items__product__updated_at')
+    count_fields = ('pk', 'items')
+    import_rejects_limit = 100
+    export_chunk_size = 2000
 
     def get_queryset(self):
         """Filter queryset based on user permissions."""
-        user = self.request.user
-        if user.is_admin:
-            return Order.objects.all()
-        return Order.objects.filter(customer=user)
+        return OrderService.get_queryset(
+            self.request.user,
+            with_items=self.action in ('list', 'retrieve'),
+            created=OrderFilter.created_range(self.request.query_params) if self.action == 'list' else None
+        )
 
     def get_permissions(self):
         """Apply stricter permissions for update/delete actions."""
@@ -73,7 +101,16 @@ class OrderViewSet(viewsets.ModelViewSet):
                 {"product_id": 3, "quantity": 1}
             ]
         }
+        With a `Prefer: respond-async` header (or `?async=true`) the order is
+        queued instead and `202 Accepted` points at its intent status.
+        With an `Idempotency-Key` header a retry gets the first response back
+        instead of placing the order again.
         """
+        return IdempotencyService.run(request, lambda: self._create(request))
+
+    def _create(self, request):
+        if self._wants_async(request):
+            return self._create_async(request)
         try:
             order = OrderService.create_order(
                 user=request.user,
@@ -87,13 +124,120 @@ class OrderViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         except NotEnoughStock as e:
-            return Response({'error': str(e)}, status=e.status_code)
+            return Response({'error': str(e)}, errors=e.details, status=e.status_code)
         except Exception as e:
             return Response(
                 {'error': 'Order creation failed'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    @staticmethod
+    def _wants_async(request):
+        prefer = request.headers.get('Prefer', '')
+        return 'respond-async' in prefer or request.query_params.get('async') in ('1', 'true')
+
+    def _create_async(self, request):
+        try:
+            intent = OrderIntentService.submit(user=request.user, data=request.data)
+        except ValidationError as e:
+            return Response({'error': str(e)}, errors=e.detail, status=status.HTTP_400_BAD_REQUEST)
+        status_url = reverse('api:order:order-intent', kwargs={'intent_id': intent.pk}, request=request)
+        return Response(
+            {'intent_id': intent.pk, 'status': intent.status, 'status_url': status_url},
+            status=status.HTTP_202_ACCEPTED,
+            headers={'Location': status_url}
+        )
+
+    @action(detail=False, methods=['get'], url_path=r'intents/(?P<intent_id>\d+)', url_name='intent')
+    def intent(self, request, intent_id=None):
+        """
+        Status of an asynchronously placed order. `?wait=<seconds>` blocks
+        until the intent is settled or the wait runs out.
+        """
+        intent = OrderIntentService.get_for_user(request.user, intent_id)
+        if intent is None:
+            return Response(errors={'error': 'Not Found'}, message='Data not found', status=status.HTTP_404_NOT_FOUND)
+        try:
+            wait = float(request.query_params.get('wait', 0))
+        except ValueError:
+            wait = 0
+        if wait > 0:
+            intent = OrderIntentService.wait(intent, wait)
+        return Response(OrderIntentSerializer(intent).data, status=status.HTTP_200_OK)
+
+    @action(
+        detail=False, methods=['post'], url_path='import',
+        permission_classes=[IsAuthenticated, IsAdminPermission], parser_classes=[MultiPartParser]
+    )
+    def bulk_import(self, request):
+        """
+        Import a JSONL or CSV file of orders sent as the `file` form field
+        (admin only). See apps.order.imports for the formats; pass
+        `skip_stock=true` to leave product stock untouched.
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': 'file is required'}, status=status.HTTP_400_BAD_REQUEST)
+        file_format = request.data.get('format') or os.path.splitext(upload.name)[1].lstrip('.').lower()
+        if file_format not in READERS:
+            return Response({'error': f'Unknown format {file_format}'}, status=status.HTTP_400_BAD_REQUEST)
+
+        rejects = []
+
+        def reject(line_no, error, record):
+            if len(rejects) < self.import_rejects_limit:
+                rejects.append({'line': line_no, 'error': error, 'record': record})
+
+        importer = OrderImporter(adjust_stock=request.data.get('skip_stock') not in ('1', 'true'), reject=reject)
+        result = importer.run(io.TextIOWrapper(upload.file, encoding='utf-8', newline=''), file_format)
+        return Response(result, errors={'rejects': rejects} if rejects else None, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'], url_path='stats', permission_classes=[IsAuthenticated, IsAdminPermission])
+    def stats(self, request):
+        """
+        Order counts and revenue per day and status, plus the best selling
+        products, for `?date_from=YYYY-MM-DD&date_to=YYYY-MM-DD` (admin only).
+        Served from the rollup tables, refreshed by a beat task.
+        """
+        try:
+            date_from = self._parse_date(request.query_params.get('date_from'))
+            date_to = self._parse_date(request.query_params.get('date_to'))
+        except ValueError:
+            return Response({'error': 'Dates must be YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(OrderStatsService.summary(date_from, date_to), status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'], url_path='export', permission_classes=[IsAuthenticated, IsAdminPermission])
+    def export(self, request):
+        """
+        Stream every order matching the usual filters (admin only) as NDJSON,
+        or as CSV with `?as=csv`. Orders are read in chunks (through a
+        server-side cursor where the database allows one), each chunk
+        prefetching its own items, so memory stays flat and the first bytes
+        go out straight away.
+        """
+        export_format = request.query_params.get('as', 'ndjson')
+        if export_format not in WRITERS:
+            return Response({'error': f'Unknown export format {export_format}'}, status=status.HTTP_400_BAD_REQUEST)
+        write, content_type = WRITERS[export_format]
+
+        queryset = OrderService.get_queryset(
+            request.user, with_items=True, created=OrderFilter.created_range(request.query_params)
+        )
+        filterset = OrderFilter(request.query_params, queryset=queryset, request=request)
+        if not filterset.is_valid():
+            return Response(errors=filterset.errors, message='Validation error', status=status.HTTP_400_BAD_REQUEST)
+        queryset = filterset.qs.order_by('pk')
+        # The rows are read after the view has returned, from the database picked now
+        orders = iterate(queryset.using(queryset.db), chunk_size=self.export_chunk_size)
+
+        response = StreamingHttpResponse(write(orders), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="orders.{export_format}"'
+        return response
+
+    @staticmethod
+    def _parse_date(value):
+        return date.fromisoformat(value) if value else None
+
     def update(self, request, *args, **kwargs):
         order = self.get_object()
         try:
@@ -110,7 +254,7 @@ class OrderViewSet(viewsets.ModelViewSet):
         except PermissionDenied as e:
             return Response({'error': str(e)}, status=status.HTTP_403_FORBIDDEN)
         except NotEnoughStock as e:
-            return Response({'error': str(e)}, status=e.status_code)
+            return Response({'error': str(e)}, errors=e.details, status=e.status_code)
         except ValidationError as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
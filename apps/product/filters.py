@@ -0,0 +1,30 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity
+from django.db import connections
+from django.db.models import F, Q
+from rest_framework import filters
+
+
+class ProductSearchFilter(filters.SearchFilter):
+    """
+    Ranked product search.
+
+    On Postgres the terms are matched against the trigger maintained
+    ``search_vector`` column (GIN indexed) and, to forgive typos, against the
+    trigram index on ``name``. Results come back best match first. On any
+    other database it behaves exactly like ``SearchFilter``.
+    """
+    config = 'simple'
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms or connections[queryset.db].vendor != 'postgresql':
+            return super().filter_queryset(request, queryset, view)
+
+        text = ' '.join(terms)
+        query = SearchQuery(text, config=self.config, search_type='websearch')
+        return queryset.annotate(
+            search_rank=SearchRank(F('search_vector'), query),
+            similarity=TrigramSimilarity('name', text),
+        ).filter(
+            Q(search_vector=query) | Q(name__trigram_similar=text)
+        ).order_by('-search_rank', '-similarity', 'id')
@@ -0,0 +1,61 @@
+# Generated by Django 4.2.9 on 2026-10-18 02:26
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+# The text search configuration has to match ProductSearchFilter.config
+SEARCH_SQL = """
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE OR REPLACE FUNCTION product_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('simple', coalesce(NEW.name, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(NEW.description, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER product_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF name, description ON product_product
+    FOR EACH ROW EXECUTE FUNCTION product_search_vector_update();
+
+UPDATE product_product SET name = name;
+
+CREATE INDEX product_search_vector_idx ON product_product USING gin (search_vector);
+CREATE INDEX product_name_trgm_idx ON product_product USING gin (name gin_trgm_ops);
+"""
+
+REVERSE_SEARCH_SQL = """
+DROP INDEX IF EXISTS product_name_trgm_idx;
+DROP INDEX IF EXISTS product_search_vector_idx;
+DROP TRIGGER IF EXISTS product_search_vector_trigger ON product_product;
+DROP FUNCTION IF EXISTS product_search_vector_update();
+"""
+
+
+def create_search_objects(apps, schema_editor):
+    # Other backends keep the plain SearchFilter behaviour
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(SEARCH_SQL)
+
+
+def drop_search_objects(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(REVERSE_SEARCH_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0002_product_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_objects, drop_search_objects),
+    ]
@@ -1,6 +1,8 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 
 from apps.base.models import BaseModel
+from .cache import ProductCache
 
 
 class Product(BaseModel):
@@ -8,6 +10,34 @@ class Product(BaseModel):
     description = models.TextField(blank=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     quantity = models.PositiveIntegerField(default=0)
+    # Kept up to date by a database trigger on Postgres, see
+    # migrations/0003_product_search.py and ProductSearchFilter
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # The catalog list walks live products by id
+            models.Index(fields=['id'], name='product_live_idx', condition=models.Q(deleted_at__isnull=True)),
+            # The purge job's scan, only ever as large as the deleted rows
+            models.Index(
+                fields=['deleted_at'], name='product_deleted_idx', condition=models.Q(deleted_at__isnull=False)
+            ),
+        ]
 
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return self.name
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        ProductCache.invalidate([self.pk])
+
+    def delete(self, *args, **kwargs):
+        pk = self.pk
+        result = super().delete(*args, **kwargs)
+        ProductCache.invalidate([pk])
+        return result
+
+    @classmethod
+    def purgeable(cls, cutoff):
+        # Products that were ever ordered stay, order items protect them
+        return super().purgeable(cutoff).filter(orderitem__isnull=True)
@@ -1,8 +1,8 @@
-from rest_framework import serializers
 from .models import Product
+from ..base.serializers import BaseModelSerializer
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(BaseModelSerializer):
     class Meta:
         model = Product
         fields = ['id', 'name', 'description', 'price','quantity', 'created_at', 'updated_at']
@@ -0,0 +1,120 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .cache import ProductCache
+from .models import Product
+from ..base.exceptions import NotEnoughStock
+from ..base.routers import primary
+
+
+class ProductService:
+
+    @classmethod
+    def get_many(cls, ids, for_update=False):
+        """
+        Load the live products for ``ids``: one ``get_many`` on the product
+        cache and a single ``IN`` query for whatever it did not have.
+        Returns ``{id: product}``; unknown and soft-deleted ids are absent.
+        ``for_update`` locks the rows, skips the cache and must run inside a
+        transaction.
+        """
+        ids = set(ids)
+        if not ids:
+            return {}
+        if for_update or not ProductCache.enabled():
+            return cls._load(ids, for_update)
+
+        products, generations = ProductCache.get_many(ids)
+        missing = ids - products.keys()
+        if missing:
+            # What goes into the cache comes from the primary, never a lagging replica
+            with primary():
+                loaded = cls._load(missing)
+            ProductCache.set_many(loaded.values(), generations)
+            products.update(loaded)
+        return products
+
+    @staticmethod
+    def _load(ids, for_update=False):
+        queryset = Product.objects.filter(pk__in=ids).order_by('pk')
+        if for_update:
+            queryset = queryset.select_for_update()
+        return {product.pk: product for product in queryset}
+
+
+class StockService:
+    """
+    Set-based stock bookkeeping for products.
+
+    Every change is a guarded ``UPDATE ... SET quantity = quantity - n
+    WHERE quantity >= n`` so the database, not Python, decides whether the
+    stock is still there. Rows are touched in ascending product id order so
+    concurrent checkouts sharing products can never deadlock each other.
+    """
+
+    @staticmethod
+    def _sum_lines(lines):
+        totals = defaultdict(int)
+        for product_id, quantity in lines:
+            totals[int(product_id)] += quantity
+        return totals
+
+    @classmethod
+    def reserve(cls, lines):
+        """
+        Take stock for ``lines`` (an iterable of ``(product_id, quantity)``).
+        Raises NotEnoughStock listing every product that could not be served.
+        """
+        cls.adjust(cls._sum_lines(lines))
+
+    @classmethod
+    def release(cls, lines):
+        """Give the stock of ``lines`` back."""
+        cls.adjust({product_id: -quantity for product_id, quantity in cls._sum_lines(lines).items()})
+
+    @classmethod
+    def adjust(cls, deltas):
+        """
+        Apply ``{product_id: quantity_to_take}``; negative values return stock.
+        Either every delta is applied or none is.
+        """
+        failed = {}
+        now = timezone.now()
+
+        with transaction.atomic():
+            for product_id in sorted(deltas):
+                delta = deltas[product_id]
+                if delta > 0:
+                    updated = Product.objects.filter(pk=product_id, quantity__gte=delta).update(
+                        quantity=F('quantity') - delta, updated_at=now
+                    )
+                    if not updated:
+                        failed[product_id] = delta
+                elif delta < 0:
+                    Product.objects.with_deleted().filter(pk=product_id).update(
+                        quantity=F('quantity') - delta, updated_at=now
+                    )
+
+            if failed:
+                raise cls._not_enough_stock(failed)
+
+            ProductCache.invalidate(deltas)
+
+    @staticmethod
+    def _not_enough_stock(failed):
+        available = dict(Product.objects.filter(pk__in=failed).values_list('id', 'quantity'))
+        items = [
+            {
+                'product_id': product_id,
+                'requested': requested,
+                'available': available.get(product_id, 0),
+            }
+            for product_id, requested in sorted(failed.items())
+        ]
+        message = "Not enough stock for product(s) {}.".format(
+            ', '.join(str(item['product_id']) for item in items)
+        )
+        return NotEnoughStock(message, details={'items': items})
@@ -1,5 +1,18 @@
-from django.test import TestCase
+from decimal import Decimal
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from apps.base import metrics
+from apps.base.exceptions import NotEnoughStock
+from apps.base.serializers import CompiledSerializer
+from apps.base.views import CompiledReadMixin
+from apps.product.cache import ProductCache
 from apps.product.models import Product
+from apps.product.serializers import ProductSerializer
+from apps.product.services import ProductService, StockService
 from rest_framework.test import APITestCase
 from django.urls import reverse
 from rest_framework import status
@@ -51,7 +64,7 @@ class ProductViewSetTests(APITestCase):
         url = "/api/products/"
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data['results']), 1)
 
     def test_product_create_as_admin(self):
         self.client.force_authenticate(user=self.admin)
@@ -77,4 +90,203 @@ class ProductViewSetTests(APITestCase):
 
         }
         response = self.client.post(url, data, format='json')
-        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_product_list_pages_by_id(self):
+        for i in range(4):
+            Product.objects.create(name=f'product {i}', price=10, quantity=1)
+        url, ids = "/api/products/?limit=2", []
+        while url:
+            response = self.client.get(url)
+            ids += [product['id'] for product in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(ids, list(Product.objects.order_by('id').values_list('id', flat=True)))
+
+
+
+class ProductSearchTests(APITestCase):
+    def setUp(self):
+        self.laptop = Product.objects.create(name='Gaming laptop', description='fast', price=10, quantity=1)
+        self.mouse = Product.objects.create(name='Mouse', description='for your laptop', price=1, quantity=1)
+        Product.objects.create(name='Desk', description='wooden', price=5, quantity=1)
+
+    def _search(self, term):
+        response = self.client.get('/api/products/', {'search': term})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [product['id'] for product in response.data['results']]
+
+    def test_search_matches_name_and_description(self):
+        self.assertEqual(sorted(self._search('laptop')), sorted([self.laptop.id, self.mouse.id]))
+
+    @skipUnless(connection.vendor == 'postgresql', 'full-text search needs Postgres')
+    def test_name_matches_rank_first(self):
+        self.assertEqual(self._search('laptop'), [self.laptop.id, self.mouse.id])
+
+    @skipUnless(connection.vendor == 'postgresql', 'trigram search needs Postgres')
+    def test_search_forgives_typos(self):
+        self.assertEqual(self._search('laptpo gaming'), [self.laptop.id])
+
+
+class CompiledProductSerializerTests(TestCase):
+    def test_output_matches_product_serializer(self):
+        Product.objects.create(name='Plain', price=Decimal('0.5'), quantity=0)
+        Product.objects.create(name='Unicode ☕', description='Ünïcode', price=Decimal('12345.67'), quantity=3)
+        products = list(Product.objects.order_by('id'))
+        compiled = CompiledSerializer.for_class(ProductSerializer)
+        self.assertEqual(compiled.many(products), ProductSerializer(products, many=True).data)
+
+
+class ProductConditionalGetTests(APITestCase):
+    def setUp(self):
+        self.product = Product.objects.create(name='etag', price=10, quantity=5)
+
+    def test_list_without_cache_validates_with_one_query(self):
+        etag = self.client.get('/api/products/')['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        Product.objects.filter(pk=self.product.pk).delete()
+        self.assertEqual(self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+
+class StockServiceTests(TestCase):
+    def setUp(self):
+        self.product1 = Product.objects.create(name='p1', price=100, quantity=5)
+        self.product2 = Product.objects.create(name='p2', price=200, quantity=1)
+
+    def test_reserve_decrements_stock(self):
+        StockService.reserve([(self.product1.id, 2), (self.product2.id, 1), (self.product1.id, 3)])
+        self.product1.refresh_from_db()
+        self.product2.refresh_from_db()
+        self.assertEqual(self.product1.quantity, 0)
+        self.assertEqual(self.product2.quantity, 0)
+
+    def test_reserve_reports_every_short_line_and_rolls_back(self):
+        with self.assertRaises(NotEnoughStock) as ctx:
+            StockService.reserve([(self.product1.id, 6), (self.product2.id, 2)])
+
+        self.assertEqual(ctx.exception.details['items'], [
+            {'product_id': self.product1.id, 'requested': 6, 'available': 5},
+            {'product_id': self.product2.id, 'requested': 2, 'available': 1},
+        ])
+        self.product1.refresh_from_db()
+        self.assertEqual(self.product1.quantity, 5)
+
+    def test_failed_line_does_not_keep_other_lines_reserved(self):
+        with self.assertRaises(NotEnoughStock):
+            StockService.reserve([(self.product1.id, 1), (self.product2.id, 2)])
+        self.product1.refresh_from_db()
+        self.assertEqual(self.product1.quantity, 5)
+
+    def test_release_returns_stock(self):
+        StockService.release([(self.product2.id, 4)])
+        self.product2.refresh_from_db()
+        self.assertEqual(self.product2.quantity, 5)
+
+
+@override_settings(PRODUCT_CACHE_ENABLED=True)
+class ProductCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        metrics.get_store().clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product = Product.objects.create(name='cached', price=100, quantity=10)
+        self.admin = User.objects.create_superuser(
+            username='admin2',
+            email="admin2@admin.com",
+            password='adminpass',
+        )
+        self.url = f'/api/products/{self.product.id}/'
+
+    def test_retrieve_reads_through_the_cache(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data['name'], 'cached')
+
+    @override_settings(METRICS_TOKEN='scrape-token')
+    def test_hits_and_misses_are_counted_on_metrics(self):
+        self.client.get(self.url)
+        self.client.get(self.url)
+        self.client.get('/api/products/')
+
+        body = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-token').content.decode()
+        self.assertIn('product_cache_hits_total{kind="item"} 1', body)
+        self.assertIn('product_cache_misses_total{kind="item"} 1', body)
+        self.assertIn('product_cache_misses_total{kind="list"} 1', body)
+
+    def test_list_is_cached_until_a_product_changes(self):
+        self.assertEqual(self.client.get('/api/products/')['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/products/')
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+        self.client.force_authenticate(user=self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(self.url, {'name': 'renamed'}, format='json')
+
+        response = self.client.get('/api/products/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'][0]['name'], 'renamed')
+        self.assertEqual(self.client.get(self.url).data['name'], 'renamed')
+
+    def test_conditional_requests_need_no_query(self):
+        list_etag = self.client.get('/api/products/')['ETag']
+        detail_etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/products/', HTTP_IF_NONE_MATCH=list_etag).status_code, 304)
+            self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=detail_etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            StockService.reserve([(self.product.id, 1)])
+        self.assertEqual(self.client.get('/api/products/', HTTP_IF_NONE_MATCH=list_etag).status_code, 200)
+
+    def test_soft_deleted_product_leaves_the_cache(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.soft_delete()
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_checkout_batch_reads_and_stock_changes_invalidate(self):
+        other = Product.objects.create(name='other', price=5, quantity=3)
+        ProductService.get_many([self.product.id, other.id])
+        with self.assertNumQueries(0):
+            products = ProductService.get_many([self.product.id, other.id])
+        self.assertEqual(set(products), {self.product.id, other.id})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            StockService.reserve([(self.product.id, 4)])
+        self.assertEqual(ProductService.get_many([self.product.id])[self.product.id].quantity, 6)
+
+    def test_a_product_loaded_before_a_write_commits_is_not_cached(self):
+        load = ProductService._load
+
+        def load_then_reprice(ids, for_update=False):
+            products = load(ids, for_update)
+            # The price changes after the row was read, before it is cached
+            with self.captureOnCommitCallbacks(execute=True):
+                product = Product.objects.get(pk=self.product.pk)
+                product.price = 120
+                product.save()
+            return products
+
+        with patch.object(ProductService, '_load', side_effect=load_then_reprice):
+            ProductService.get_many([self.product.id])
+        self.assertEqual(ProductService.get_many([self.product.id])[self.product.id].price, 120)
+
+    def test_a_page_read_before_a_write_commits_is_not_cached(self):
+        read_page = CompiledReadMixin.list
+
+        def read_then_rename(view, request, *args, **kwargs):
+            response = read_page(view, request, *args, **kwargs)
+            with self.captureOnCommitCallbacks(execute=True):
+                Product.objects.filter(pk=self.product.pk).update(name='renamed')
+                ProductCache.invalidate([self.product.pk])
+            return response
+
+        with patch.object(CompiledReadMixin, 'list', read_then_rename):
+            self.assertEqual(self.client.get('/api/products/').data['results'][0]['name'], 'cached')
+        response = self.client.get('/api/products/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'][0]['name'], 'renamed')
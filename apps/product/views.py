@@ -1,17 +1,72 @@
 # products/views.py
 from drf_spectacular.utils import extend_schema
 from rest_framework import viewsets,filters
+from rest_framework.exceptions import NotFound
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from rest_framework.response import Response
+from .cache import ProductCache
+from .filters import ProductSearchFilter
 from .models import Product
 from .serializers import ProductSerializer
+from .services import ProductService
+from ..base.pagination import KeysetPagination
 from ..base.permissions import IsAdminOrReadOnly
+from ..base.routers import primary
+from ..base.views import CompiledReadMixin, ConditionalGetMixin, ReplicaReadMixin
 
 
 @extend_schema(tags=['Products Endpoints'])
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(ReplicaReadMixin, ConditionalGetMixin, CompiledReadMixin, viewsets.ModelViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     permission_classes = [IsAdminOrReadOnly]
-    filter_backends = [filters.SearchFilter]
-    search_fields = ['name',"description"]
\ No newline at end of file
+    filter_backends = [ProductSearchFilter]
+    search_fields = ['name',"description"]
+    ordering = ['id']
+    pagination_class = KeysetPagination
+    throttle_scope = 'products'
+
+    def list(self, request, *args, **kwargs):
+        """Serve list and search pages from the product cache when possible."""
+        if not ProductCache.enabled():
+            return super().list(request, *args, **kwargs)
+
+        # Every product write bumps the catalog version, which makes it a
+        # validator for the cached pages that needs no query. Read once: a
+        # page is cached under the version from before it was read
+        version = ProductCache.list_version()
+        etag = self.make_etag(version)
+        return self.conditional_response(etag, None, lambda: self._cached_list(request, version, *args, **kwargs))
+
+    def _cached_list(self, request, version, *args, **kwargs):
+        url = request.build_absolute_uri()
+        data = ProductCache.get_list(url, version)
+        if data is not None:
+            return Response(data, headers={'X-Cache': 'HIT'})
+
+        # Skips ConditionalGetMixin, the validators are settled already. Read
+        # from the primary, a lagging replica would cache a stale page
+        with primary():
+            response = CompiledReadMixin.list(self, request, *args, **kwargs)
+        ProductCache.set_list(url, version, response.data)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Read a single product through ProductService so it comes from the
+        cache, and validate conditional requests against its updated_at.
+        """
+        try:
+            pk = int(kwargs[self.lookup_field])
+        except ValueError:
+            raise NotFound()
+        instance = ProductService.get_many([pk]).get(pk)
+        if instance is None:
+            raise NotFound()
+        self.check_object_permissions(request, instance)
+        return self.conditional_response(
+            self.make_etag(instance.updated_at), instance.updated_at,
+            lambda: Response(self.get_read_serializer().to_representation(instance))
+        )
@@ -1,7 +1,12 @@
 from django.contrib.auth.models import BaseUserManager
+from django.utils.translation import gettext_lazy as _
 
+from ..base.managers import BaseManager
+
+
+class UserManager(BaseManager, BaseUserManager):
+    """Live users only, like every BaseModel manager; see ``with_deleted()``."""
 
-class UserManager(BaseUserManager):
     def create_user(self, email, password=None, is_admin=False, **extra_fields):
         if not email:
             raise ValueError(_('Users must have an email address'))
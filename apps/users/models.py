@@ -2,6 +2,7 @@ from django.db import models
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin
 
 from ..base.models import BaseModel
+from .cache import UserCache
 from .managers import UserManager
 
 
@@ -9,19 +10,49 @@ class User(BaseModel, AbstractBaseUser, PermissionsMixin):
     is_active = models.BooleanField(default=True)
     is_admin = models.BooleanField(default=False)
     username = models.CharField(max_length=255, unique=True)
-    email = models.EmailField(unique=True)
+    email = models.EmailField()
 
     objects = UserManager()
 
+    archive_exclude = ('password',)
+
     USERNAME_FIELD = 'username'
     REQUIRED_FIELDS = ('email',)
 
+    class Meta:
+        constraints = [
+            # An address is free again once its account is deleted
+            models.UniqueConstraint(
+                fields=['email'], name='user_email_live_unique', condition=models.Q(deleted_at__isnull=True)
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['id'], name='user_live_idx', condition=models.Q(deleted_at__isnull=True)),
+            # The purge job's scan, only ever as large as the deleted rows
+            models.Index(fields=['deleted_at'], name='user_deleted_idx', condition=models.Q(deleted_at__isnull=False)),
+        ]
+
     def __str__(self):
         return self.username
 
     def is_staff(self):
         return self.is_admin
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        UserCache.invalidate(self.pk)
+
+    def delete(self, *args, **kwargs):
+        pk = self.pk
+        result = super().delete(*args, **kwargs)
+        UserCache.invalidate(pk)
+        return result
+
+    @classmethod
+    def purgeable(cls, cutoff):
+        # Customers with orders are kept for the order history
+        return super().purgeable(cutoff).filter(orders__isnull=True)
+
 
 class Profile(BaseModel):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -29,5 +60,12 @@ class Profile(BaseModel):
     last_name = models.CharField(max_length=100, null=True, blank=True)
     phone_number = models.CharField(max_length=11, null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['deleted_at'], name='profile_deleted_idx', condition=models.Q(deleted_at__isnull=False)
+            ),
+        ]
+
     def __str__(self):
         return f'User ({self.user.username})\'s profile'
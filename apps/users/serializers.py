@@ -26,7 +26,9 @@ class UserSerializer(BaseModelSerializer):
     confirm_password = serializers.CharField(max_length=255, write_only=True)
 
     def validate_username(self, username):
-        if User.objects.filter(username=username).exists():
+        # Usernames stay unique across deleted accounts too, they are what
+        # authentication looks users up by
+        if User.objects.with_deleted().filter(username=username).exists():
             raise serializers.ValidationError('username already taken')
         return username
 
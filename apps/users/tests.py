@@ -0,0 +1,104 @@
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.base import metrics
+from apps.users.cache import UserCache
+from apps.users.models import User
+from apps.users.repositories import UserRepository
+from apps.users.services import UserService
+
+
+@override_settings(USER_CACHE_ENABLED=True)
+class CachedAuthenticationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        UserCache.forget_local()
+        metrics.get_store().clear()
+        self.user = User.objects.create_user(username='cached', email='cached@admin.com', password='testpass')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def _me(self):
+        return self.client.get('/api/users/me/')
+
+    def test_authenticated_requests_do_not_query_the_user(self):
+        response = self._me()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['data']['user']['username'], 'cached')
+
+        with self.assertNumQueries(0):
+            response = self._me()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # A fresh process still skips the database through the shared cache
+        UserCache.forget_local()
+        with self.assertNumQueries(0):
+            self._me()
+
+        body = metrics.render(metrics.get_store().snapshot())
+        self.assertIn('user_cache_hits_total{layer="local"} 1', body)
+        self.assertIn('user_cache_hits_total{layer="shared"} 1', body)
+        self.assertIn('user_cache_misses_total 1', body)
+
+    def test_update_through_repository_is_seen(self):
+        self._me()
+        with self.captureOnCommitCallbacks(execute=True):
+            UserRepository().update(self.user, {
+                'email': 'changed@admin.com', 'password': 'Secret123!', 'confirm_password': 'Secret123!'
+            })
+        self.assertEqual(self._me().data['data']['user']['email'], 'changed@admin.com')
+
+    def test_deactivated_user_is_rejected(self):
+        self._me()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertEqual(self._me().status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_soft_deleted_user_is_rejected(self):
+        self._me()
+        with self.captureOnCommitCallbacks(execute=True):
+            UserService().delete(self.user.pk)
+        self.assertEqual(self._me().status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_invalidation_during_a_load_is_not_undone(self):
+        load = UserCache._load
+
+        def load_then_deactivate(pk):
+            user = load(pk)
+            # An admin deactivates the user after the row was read, before it is cached
+            with self.captureOnCommitCallbacks(execute=True):
+                deactivated = User.objects.get(pk=pk)
+                deactivated.is_active = False
+                deactivated.save()
+            return user
+
+        with patch.object(UserCache, '_load', side_effect=load_then_deactivate):
+            self.assertTrue(UserCache.get(self.user.pk).is_active)
+
+        # Another process, past its local entry, must not get the stale row
+        UserCache.forget_local()
+        self.assertEqual(self._me().status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_cached_user_is_a_copy(self):
+        first = UserCache.get(self.user.pk)
+        first.username = 'mutated'
+        self.assertEqual(UserCache.get(self.user.pk).username, 'cached')
+
+
+class SoftDeletedUserTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='gone', email='gone@admin.com', password='Secret123!')
+        self.user.soft_delete()
+
+    def test_deleted_user_cannot_log_in(self):
+        response = self.client.post('/api/users/login', {'username': 'gone', 'password': 'Secret123!'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_email_of_deleted_user_can_be_reused(self):
+        user = User.objects.create_user(username='back', email='gone@admin.com', password='Secret123!')
+        self.assertEqual(User.objects.get(email='gone@admin.com'), user)
@@ -4,7 +4,7 @@ from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 
 from ..base.services import BaseService
-from ..base.views import BaseViewSet
+from ..base.views import BaseViewSet, ReplicaReadMixin
 from ..base.responses import Response
 from ..base.permissions import IsAdminPermission
 from .serializers import UserSerializer
@@ -13,9 +13,10 @@ from .services import UserService
 
 @extend_schema(tags=['Users Endpoints'])
 
-class UserViewSet(BaseViewSet):
+class UserViewSet(ReplicaReadMixin, BaseViewSet):
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated]
+    throttle_scope = 'users'
 
     def _get_service(self) -> BaseService:
         return UserService()
@@ -33,11 +34,10 @@ class UserViewSet(BaseViewSet):
 
     @action(detail=False, methods=['get'], url_path='me')
     def get_me(self, request, *args, **kwargs):
-        user_id = request.user.id
-        data = self._service.get_by_id(user_id)
+        # request.user is already the live user, resolved by the authentication class
         return Response(
             data={
-                'user': self.get_serializer(data).data
+                'user': self.get_serializer(request.user).data
             }, message='the user', meta={}
         )
 
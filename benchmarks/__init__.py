@@ -0,0 +1,13 @@
+"""
+Standalone benchmarks, run from the project root with ``python -m benchmarks.<name>``.
+They use the test settings unless DJANGO_SETTINGS_MODULE says otherwise.
+"""
+import os
+import sys
+
+
+def setup():
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'order_management.settings.test')
+    import django
+    django.setup()
@@ -0,0 +1,209 @@
+"""
+End to end API benchmark: seeds a test database, then drives the hot
+endpoints in-process through the DRF test client and reports throughput
+and p50/p95/p99 latency per scenario:
+
+    python -m benchmarks.api --iterations 200 --save before.json
+    python -m benchmarks.api --compare before.json --threshold 10
+
+With --compare, scenarios whose latency percentiles grew (or throughput
+fell) by more than the threshold are flagged and the exit status is 1.
+--results compares a stored run instead of running again. The database
+is a throwaway test database of whatever DJANGO_SETTINGS_MODULE points at.
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from . import setup
+
+PERCENTILES = (50, 95, 99)
+
+
+def seed(customers, products, orders, seed_value):
+    """The skewed dataset of ``manage.py seed``, plus an admin to list every order with."""
+    from django.contrib.auth.hashers import make_password
+    from django.db.models import Count
+    from apps.order.models import Order
+    from apps.order.seed import Seeder
+    from apps.product.models import Product
+    from apps.users.models import User
+
+    created = Seeder(seed=seed_value).run(customers, products, orders)
+    admin = User.objects.create(username='admin', email='admin@example.com', password=make_password('x'), is_admin=True)
+    users = list(User.objects.filter(pk__range=created['users']))
+    # Benchmark orders must not run out of stock
+    Product.objects.update(quantity=10 ** 9)
+    catalog = list(Product.objects.all())
+    # The heaviest customer first, the one the skew gives the most orders
+    heaviest = Order.objects.values('customer').annotate(count=Count('pk')).order_by('-count')[0]['customer']
+    users.sort(key=lambda user: user.pk != heaviest)
+    return users, admin, catalog
+
+
+def scenarios(users, admin, catalog, rng):
+    """``{name: request}``, each request a callable returning a response."""
+    from rest_framework.test import APIClient
+    from rest_framework_simplejwt.tokens import AccessToken
+    from apps.order.models import Order
+    from apps.order.seed import WORDS
+
+    def client_for(user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+        return client
+
+    customer = users[0]
+    admin_client, customer_client = client_for(admin), client_for(customer)
+    updated = Order.objects.filter(customer=customer).order_by('pk').first()
+
+    def lines(count):
+        return [{'product_id': product.pk, 'quantity': 1} for product in rng.sample(catalog, count)]
+
+    def create(count):
+        return lambda: customer_client.post('/api/orders/', {'items': lines(count)}, format='json')
+
+    return {
+        'order_create_1': create(1),
+        'order_create_10': create(10),
+        'order_create_50': create(50),
+        'order_list_admin': lambda: admin_client.get('/api/orders/'),
+        'order_list_customer': lambda: customer_client.get('/api/orders/'),
+        'order_update_items': lambda: customer_client.patch(
+            f'/api/orders/{updated.pk}/', {'items': lines(5)}, format='json'
+        ),
+        'product_search': lambda: customer_client.get('/api/products/', {'search': rng.choice(WORDS)}),
+        'users_me': lambda: customer_client.get('/api/users/me/'),
+    }
+
+
+def percentile(ordered, pct):
+    """Nearest rank percentile of an ascending list."""
+    return ordered[max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))]
+
+
+def measure(request, iterations, warmup):
+    for _ in range(warmup):
+        request()
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        begin = time.perf_counter()
+        response = request()
+        latencies.append(time.perf_counter() - begin)
+        if response.status_code >= 400:
+            raise RuntimeError(f'{response.status_code}: {response.content[:500]!r}')
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    result = {'iterations': iterations, 'throughput': iterations / elapsed, 'mean_ms': sum(latencies) / iterations * 1000}
+    for pct in PERCENTILES:
+        result[f'p{pct}_ms'] = percentile(latencies, pct) * 1000
+    return result
+
+
+def run(args):
+    setup()
+    from django.conf import settings
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        rng = random.Random(args.seed)
+        started = time.perf_counter()
+        users, admin, catalog = seed(args.customers, args.products, args.orders, args.seed)
+        print(f'seeded {args.customers} customers, {args.products} products, {args.orders} orders '
+              f'in {time.perf_counter() - started:.1f} s', file=sys.stderr)
+
+        results = {}
+        for name, request in scenarios(users, admin, catalog, rng).items():
+            if args.only and name not in args.only:
+                continue
+            results[name] = measure(request, args.iterations, args.warmup)
+            print_result(name, results[name])
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    return {
+        'meta': {
+            'created': datetime.now(dt_timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'database': connection.vendor,
+            'settings': settings.SETTINGS_MODULE,
+            'seed': args.seed,
+            'dataset': {'customers': args.customers, 'products': args.products, 'orders': args.orders},
+            'iterations': args.iterations,
+        },
+        'scenarios': results,
+    }
+
+
+def print_result(name, result):
+    percentiles = '  '.join(f'p{pct} {result[f"p{pct}_ms"]:8.2f} ms' for pct in PERCENTILES)
+    print(f'{name:<20} {result["throughput"]:8.1f} req/s  {percentiles}')
+
+
+def compare(baseline, current, threshold):
+    """Print the change per scenario and return the regressions beyond ``threshold`` percent."""
+    regressions = []
+    for name, now in current['scenarios'].items():
+        before = baseline['scenarios'].get(name)
+        if before is None:
+            print(f'{name:<20} new')
+            continue
+        changes = {f'p{pct}': _change(before[f'p{pct}_ms'], now[f'p{pct}_ms']) for pct in PERCENTILES}
+        # For throughput a drop is the regression
+        changes['throughput'] = (before['throughput'] - now['throughput']) / before['throughput'] * 100
+        worse = [metric for metric, change in changes.items() if change > threshold]
+        print(f'{name:<20} ' + '  '.join(f'{metric} {change:+6.1f}%' for metric, change in changes.items())
+              + ('  REGRESSION' if worse else ''))
+        if worse:
+            regressions.append((name, worse))
+    return regressions
+
+
+def _change(before, now):
+    return (now - before) / before * 100 if before else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--customers', type=int, default=200)
+    parser.add_argument('--products', type=int, default=1000)
+    parser.add_argument('--orders', type=int, default=5000)
+    parser.add_argument('--iterations', type=int, default=200, help='measured requests per scenario')
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--only', nargs='*', help='scenario names to run')
+    parser.add_argument('--save', help='write the results to this JSON file')
+    parser.add_argument('--results', help='compare these stored results instead of running')
+    parser.add_argument('--compare', help='baseline JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=10.0, help='regression threshold in percent')
+    args = parser.parse_args()
+
+    if args.results:
+        with open(args.results) as f:
+            results = json.load(f)
+    else:
+        results = run(args)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, results, args.threshold)
+        if regressions:
+            print(f'{len(regressions)} scenario(s) regressed by more than {args.threshold:g}%', file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""
+Stock JSON renderer and parser against the orjson backed ones on order list
+payloads built by the compiled OrderSerializer, no database involved:
+
+    python -m benchmarks.renderers --orders 50 --pages 200
+"""
+import argparse
+from io import BytesIO
+
+from . import setup
+from .serializers import build_orders, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--orders', type=int, default=50, help='orders per page')
+    parser.add_argument('--pages', type=int, default=200)
+    parser.add_argument('--items', type=int, default=3)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    setup()
+    from rest_framework.parsers import JSONParser
+    from rest_framework.renderers import JSONRenderer
+    from apps.base.parsers import FastJSONParser
+    from apps.base.renderers import FastJSONRenderer
+    from apps.base.serializers import CompiledSerializer
+    from apps.order.serializers import OrderSerializer
+
+    orders, _ = build_orders(args.orders, args.items)
+    page = {'count': args.orders * args.pages, 'next': None, 'previous': None,
+            'results': CompiledSerializer.for_class(OrderSerializer).many(orders)}
+    body = JSONRenderer().render(page)
+    assert FastJSONRenderer().render(page) == body
+
+    for name, stock, fast in (
+        ('render', lambda: JSONRenderer().render(page), lambda: FastJSONRenderer().render(page)),
+        ('parse', lambda: JSONParser().parse(BytesIO(body)), lambda: FastJSONParser().parse(BytesIO(body))),
+    ):
+        slow_time = timed(lambda: [stock() for _ in range(args.pages)], args.repeat)
+        fast_time = timed(lambda: [fast() for _ in range(args.pages)], args.repeat)
+        print(f'{name:<7} {args.pages} pages of {len(body) // 1024} KiB  stdlib {slow_time * 1000:8.1f} ms  '
+              f'orjson {fast_time * 1000:8.1f} ms  x{slow_time / fast_time:.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+DRF serializers against their CompiledSerializer twins on in-memory orders
+and products, no database involved:
+
+    python -m benchmarks.serializers --orders 10000 --items 3
+"""
+import argparse
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from . import setup
+
+
+def build_orders(count, items_per_order):
+    from django.utils import timezone
+    from apps.order.models import Order, OrderItem
+    from apps.product.models import Product
+    from apps.users.models import User
+
+    now = timezone.now()
+    customers = [
+        User(id=i, username=f'customer{i}', email=f'customer{i}@example.com', created_at=now, updated_at=now)
+        for i in range(1, 101)
+    ]
+    products = [
+        Product(id=i, name=f'product {i}', description='benchmark product', price=Decimal('19.99'),
+                quantity=100, created_at=now, updated_at=now)
+        for i in range(1, 201)
+    ]
+    orders = []
+    for i in range(count):
+        order = Order(id=i + 1, customer=customers[i % len(customers)], status='PENDING',
+                      total_price=Decimal('59.97'), created_at=now - timedelta(minutes=i), updated_at=now)
+        order._prefetched_objects_cache = {'items': [
+            OrderItem(id=i * items_per_order + n, order=order, product=products[(i + n) % len(products)],
+                      quantity=n + 1, price=Decimal('19.99'))
+            for n in range(items_per_order)
+        ]}
+        orders.append(order)
+    return orders, products
+
+
+def timed(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--orders', type=int, default=10000)
+    parser.add_argument('--items', type=int, default=3)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    setup()
+    from apps.base.serializers import CompiledSerializer
+    from apps.order.serializers import OrderSerializer
+    from apps.product.serializers import ProductSerializer
+
+    orders, products = build_orders(args.orders, args.items)
+    for name, serializer_class, objects in (
+        ('orders', OrderSerializer, orders),
+        ('products', ProductSerializer, products * (args.orders // len(products) or 1)),
+    ):
+        compiled = CompiledSerializer.for_class(serializer_class)
+        assert compiled.many(objects[:100]) == serializer_class(objects[:100], many=True).data
+        drf = timed(lambda: serializer_class(objects, many=True).data, args.repeat)
+        fast = timed(lambda: compiled.many(objects), args.repeat)
+        print(f'{name:<9} {len(objects):>6}  drf {drf * 1000:8.1f} ms  compiled {fast * 1000:8.1f} ms  '
+              f'x{drf / fast:.1f}')
+
+
+if __name__ == '__main__':
+    main()
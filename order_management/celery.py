@@ -4,6 +4,10 @@ from celery import Celery
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'order_management.settings.local')
 
+# With DJANGO_SETTINGS_MODULE set celery installs its Django fixup: forked
+# workers drop the connections inherited from the parent and every task
+# ends with close_if_unusable_or_obsolete(), so workers keep connections for
+# CONN_MAX_AGE and health check them like the web processes do.
 app = Celery('order_management')
 app.config_from_object('django.conf:settings', namespace='CELERY')
 app.autodiscover_tasks()
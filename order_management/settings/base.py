@@ -63,6 +63,7 @@ DJANGO_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 ]
 
 THIRD_PARTY_APPS = [
@@ -75,9 +76,11 @@ THIRD_PARTY_APPS = [
 ]
 
 LOCAL_APPS = [
+    'apps.base',
     'apps.users',
     'apps.order',
     'apps.product',
+    'apps.analytics',
     # custom apps go here
 ]
 
@@ -88,6 +91,8 @@ INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 # region MIDDLEWARE ------------------------------------------------------------
 
 MIDDLEWARE = [
+    # First, so its timings include the rest of the stack
+    'apps.base.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -98,12 +103,33 @@ MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
 ]
 
+# Per view request metrics (apps.base.middleware.MetricsMiddleware), served
+# on /metrics. With Redis as the cache every process adds its figures to
+# Redis every METRICS_FLUSH_INTERVAL seconds, otherwise each process only
+# reports its own. Scrapers send ``Authorization: Bearer <METRICS_TOKEN>``;
+# without a token the endpoint only answers when DEBUG is on
+METRICS_ENABLED = env.bool('METRICS_ENABLED', default=True)
+METRICS_FLUSH_INTERVAL = env.int('METRICS_FLUSH_INTERVAL', default=5)  # seconds
+METRICS_TOKEN = env('METRICS_TOKEN', default='')
+
 # endregion --------------------------------------------------------------------
 
 # region DATABASES -------------------------------------------------------------
 
 # https://docs.djangoproject.com/en/3.0/ref/settings/#databases
 
+# Connections are kept for DB_CONN_MAX_AGE seconds (0 closes them after every
+# request) and checked before being reused. Celery workers recycle theirs
+# the same way between tasks, through celery's Django fixup.
+#
+# Behind a transaction pooling PgBouncer set DB_TRANSACTION_POOLING: each
+# transaction may run on a different server connection, so server-side
+# cursors (which live across transactions) are off and large reads go
+# through apps.base.db.iterate() instead. No session state is set either,
+# as long as the database's own TimeZone is UTC (ALTER ROLE ... SET timezone
+# TO 'UTC'); Django only issues SET TIME ZONE when it differs.
+DB_TRANSACTION_POOLING = env.bool('DB_TRANSACTION_POOLING', default=False)
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -112,9 +138,25 @@ DATABASES = {
         'PORT': env('POSTGRES_DB_PORT', default=5432),
         'USER': env('POSTGRES_USER', default='postgres'),
         'PASSWORD': env('POSTGRES_PASSWORD', default='postgres'),
+        'CONN_MAX_AGE': env.int('DB_CONN_MAX_AGE', default=60),
+        'CONN_HEALTH_CHECKS': env.bool('DB_CONN_HEALTH_CHECKS', default=True),
+        'DISABLE_SERVER_SIDE_CURSORS': DB_TRANSACTION_POOLING,
     }
 }
 
+# Read replicas, one per host in POSTGRES_REPLICA_HOSTS and otherwise set up
+# like the primary. Safe-method requests on the order, product and user
+# endpoints read from one of them (apps.base.routers). A user whose request
+# wrote anything reads from the primary for the next REPLICA_STICKY_SECONDS,
+# which should exceed the replication lag.
+DATABASES.update({
+    f'replica_{index}': {**DATABASES['default'], 'HOST': host, 'TEST': {'MIRROR': 'default'}}
+    for index, host in enumerate(env.list('POSTGRES_REPLICA_HOSTS', default=[]), 1)
+})
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['apps.base.routers.ReplicaRouter']
+REPLICA_STICKY_SECONDS = env.int('REPLICA_STICKY_SECONDS', default=10)
+
 # endregion --------------------------------------------------------------------
 
 # region TEMPLATES -------------------------------------------------------------
@@ -181,17 +223,41 @@ PASSWORD_HASHERS = [
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'apps.base.renderers.FastJSONRenderer',
     ],
     'DEFAULT_PARSER_CLASSES': [
-        'rest_framework.parsers.JSONParser',
+        'apps.base.parsers.FastJSONParser',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'apps.users.authentication.CachedJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'apps.base.throttling.TokenBucketThrottle',
+    ],
+}
+
+# Token bucket limits on writes per view throttle_scope and user tier, see
+# apps.base.throttling.TokenBucketThrottle. None means unlimited.
+RATE_LIMIT_ENABLED = env.bool('RATE_LIMIT_ENABLED', default=True)
+RATE_LIMITS = {
+    'orders': {
+        'admin': env('RATE_LIMIT_ORDERS_ADMIN', default='600/min'),
+        'customer': env('RATE_LIMIT_ORDERS_CUSTOMER', default='30/min'),
+        'anon': None,
+    },
+    'products': {
+        'admin': env('RATE_LIMIT_PRODUCTS_ADMIN', default='300/min'),
+        'customer': env('RATE_LIMIT_PRODUCTS_CUSTOMER', default='30/min'),
+        'anon': None,
+    },
+    'users': {
+        'admin': env('RATE_LIMIT_USERS_ADMIN', default='120/min'),
+        'customer': env('RATE_LIMIT_USERS_CUSTOMER', default='10/min'),
+        'anon': env('RATE_LIMIT_USERS_ANON', default='5/min'),
+    },
 }
 
 # Swagger
@@ -222,6 +288,23 @@ CACHES = {
 
 CACHE_TTL = 60 * 15  # Cache time to live is 15 minutes.
 
+# Read-through product cache (apps.product.cache.ProductCache)
+PRODUCT_CACHE_ENABLED = env.bool('PRODUCT_CACHE_ENABLED', default=True)
+
+# Authenticated users (apps.users.cache.UserCache): a per-process LRU of
+# USER_CACHE_LOCAL_SIZE users, each trusted for USER_CACHE_LOCAL_TTL seconds
+# before the shared cache is asked again
+USER_CACHE_ENABLED = env.bool('USER_CACHE_ENABLED', default=True)
+USER_CACHE_LOCAL_SIZE = env.int('USER_CACHE_LOCAL_SIZE', default=1024)
+USER_CACHE_LOCAL_TTL = env.int('USER_CACHE_LOCAL_TTL', default=10)
+
+# Idempotency-Key on order creation (apps.order.idempotency): replays are
+# kept for IDEMPOTENCY_KEY_TTL, a duplicate waits up to IDEMPOTENCY_WAIT for
+# the request holding the key, which holds it for IDEMPOTENCY_LOCK_TIMEOUT at most
+IDEMPOTENCY_KEY_TTL = env.int('IDEMPOTENCY_KEY_TTL', default=60 * 60 * 24)  # seconds
+IDEMPOTENCY_WAIT = env.int('IDEMPOTENCY_WAIT', default=10)  # seconds
+IDEMPOTENCY_LOCK_TIMEOUT = env.int('IDEMPOTENCY_LOCK_TIMEOUT', default=30)  # seconds
+
 # endregion --------------------------------------------------------------------
 
 # region JWT -------------------------------------------------------------------
@@ -252,4 +335,52 @@ CELERY_RESULT_EXTENDED = True
 CELERY_RESULT_BACKEND_ALWAYS_RETRY = True
 CELERY_BROKER_CONNECTION_RETRY_ON_STARTUP = True
 
+# Asynchronous checkout (apps.order.services.OrderIntentService)
+ORDER_INTENT_BATCH_SIZE = env.int('ORDER_INTENT_BATCH_SIZE', default=100)
+ORDER_INTENT_MAX_WAIT = env.int('ORDER_INTENT_MAX_WAIT', default=10)  # seconds
+# Intents still processing after this long are re-queued by recover_order_intents
+ORDER_INTENT_PROCESSING_TIMEOUT = env.int('ORDER_INTENT_PROCESSING_TIMEOUT', default=60 * 5)  # seconds
+
+# Order rollups (apps.analytics.services.OrderStatsService)
+ORDER_STATS_WATERMARK_LAG = env.int('ORDER_STATS_WATERMARK_LAG', default=300)  # seconds
+
+# Soft-delete purge (apps.base.purge.SoftDeletePurgeService): rows of
+# PURGE_MODELS deleted more than SOFT_DELETE_RETENTION_DAYS ago move to the
+# archive PURGE_BATCH_SIZE at a time, PURGE_BATCH_PAUSE apart
+SOFT_DELETE_RETENTION_DAYS = env.int('SOFT_DELETE_RETENTION_DAYS', default=30)
+PURGE_MODELS = env.list('PURGE_MODELS', default=['product.Product', 'users.Profile', 'users.User'])
+PURGE_BATCH_SIZE = env.int('PURGE_BATCH_SIZE', default=500)
+PURGE_BATCH_PAUSE = env.float('PURGE_BATCH_PAUSE', default=0.1)  # seconds
+
+# Monthly partitions of the order tables on Postgres (apps.order.partitions),
+# set up once with `manage.py order_partitions --convert`. Beat keeps
+# ORDER_PARTITION_MONTHS_AHEAD months ready and detaches months older than
+# ORDER_PARTITION_RETENTION_MONTHS when that is set
+ORDER_PARTITIONING = env.bool('ORDER_PARTITIONING', default=False)
+ORDER_PARTITION_MONTHS_AHEAD = env.int('ORDER_PARTITION_MONTHS_AHEAD', default=3)
+ORDER_PARTITION_RETENTION_MONTHS = env.int('ORDER_PARTITION_RETENTION_MONTHS', default=None)
+
+CELERY_BEAT_SCHEDULE = {
+    'refresh-order-stats': {
+        'task': 'apps.analytics.tasks.refresh_order_stats',
+        'schedule': env.int('ORDER_STATS_REFRESH_INTERVAL', default=60),
+    },
+    'purge-soft-deleted': {
+        'task': 'apps.base.tasks.purge_soft_deleted',
+        'schedule': env.int('PURGE_INTERVAL', default=60 * 60 * 24),
+    },
+    'recover-order-intents': {
+        'task': 'apps.order.tasks.recover_order_intents',
+        'schedule': env.int('ORDER_INTENT_RECOVERY_INTERVAL', default=60),
+    },
+    'purge-idempotency-keys': {
+        'task': 'apps.order.tasks.purge_idempotency_keys',
+        'schedule': env.int('IDEMPOTENCY_PURGE_INTERVAL', default=60 * 60),
+    },
+    'maintain-order-partitions': {
+        'task': 'apps.order.tasks.maintain_order_partitions',
+        'schedule': env.int('ORDER_PARTITION_MAINTENANCE_INTERVAL', default=60 * 60 * 24),
+    },
+}
+
 # endregion --------------------------------------------------------------------
@@ -14,9 +14,31 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': 'db.sqlite3',
-    }
+        # A file backed test database (instead of the in-memory default) lets
+        # concurrency tests run real threads against it; writers queue on the
+        # busy timeout rather than failing straight away.
+        'OPTIONS': {'timeout': 30},
+        'TEST': {'NAME': 'test_db.sqlite3'},
+    },
+    # Stands in for a read replica: its own connection to the same database
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': 'db.sqlite3',
+        'OPTIONS': {'timeout': 30},
+        'TEST': {'MIRROR': 'default'},
+    },
 }
 
+# A PostgreSQL URL in TEST_DATABASE_URL runs the suite on Postgres instead,
+# which the tests of Postgres only features (search, partitioning) need
+if env('TEST_DATABASE_URL', default=''):
+    DATABASES['default'] = env.db_url('TEST_DATABASE_URL')
+    DATABASES['replica'] = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+
+# A TestCase's rows are uncommitted and so invisible to the replica's
+# connection. Routing tests turn replicas on in a TransactionTestCase.
+DATABASE_REPLICAS = []
+
 # endregion --------------------------------------------------------------------
 
 # region PASSWORDS -------------------------------------------------------------
@@ -34,4 +56,25 @@ CACHES = {
     },
 }
 
+# The locmem cache outlives each test's rolled back transaction, tests that
+# exercise the product or user cache turn it on and clear it themselves.
+PRODUCT_CACHE_ENABLED = False
+USER_CACHE_ENABLED = False
+
+# endregion --------------------------------------------------------------------
+
+# region RATE LIMITING ---------------------------------------------------------
+
+# Buckets live in the test process, tests of the limits turn them on
+RATE_LIMIT_ENABLED = False
+
+# endregion --------------------------------------------------------------------
+
+# region CELERY ----------------------------------------------------------------
+
+CELERY_TASK_ALWAYS_EAGER = True
+CELERY_TASK_EAGER_PROPAGATES = True
+
 # endregion --------------------------------------------------------------------
+
+PURGE_BATCH_PAUSE = 0
@@ -19,6 +19,8 @@ from django.urls import path, include
 from django.views.generic import RedirectView
 from drf_spectacular.views import SpectacularAPIView, SpectacularRedocView, SpectacularSwaggerView
 
+from apps.base.views import metrics_view
+
 urlpatterns = [
     path('', RedirectView.as_view(url='schema/swagger-ui/'), name='redirect-old-to-new'),
     path('schema/', SpectacularAPIView.as_view(), name='schema'),
@@ -26,4 +28,5 @@ urlpatterns = [
     path('schema/redoc/', SpectacularRedocView.as_view(url_name='schema'), name='redoc'),
     path('admin/', admin.site.urls),
     path('api/', include(('apps.api.urls', 'api'))),
+    path('metrics', metrics_view, name='metrics'),
 ]